@@ -0,0 +1,168 @@
+"""
+Benchmark the lexer and the parser on synthetic scripts of growing size.
+
+    python -m benchmarks [--sizes N [N ...]] [--output results.json] [--baseline baseline.json]
+
+For every size it records the best lex and parse time out of --repeat runs, the
+    throughput they give and the peak memory traced while parsing, then fits how parse
+    and lex time scale with the node count. Results are written as JSON, which a later
+    run can compare against with --baseline. The exit status is 1 when any measurement
+    is more than --tolerance worse than the baseline.
+"""
+import argparse
+import json
+import math
+import platform
+import sys
+import time
+import tracemalloc
+
+from benchmarks.generate import generate_script
+from stunning import lexer, parser
+
+# Measurements compared against a baseline, all of them lower is better.
+COMPARED = ("lex_seconds", "parse_seconds", "peak_bytes")
+
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _slope(points):
+    """
+    :returns: Least squares slope of log(y) over log(x), 1.0 is linear scaling. None
+        without at least two distinct x.
+    """
+    logs = [(math.log(x), math.log(y)) for x, y in points if x > 0 and y > 0]
+    if len(logs) < 2:
+        return None
+    mean_x = sum(x for x, _ in logs) / len(logs)
+    mean_y = sum(y for _, y in logs) / len(logs)
+    spread = sum((x - mean_x) ** 2 for x, _ in logs)
+    if not spread:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in logs) / spread
+
+
+def measure(size, parameters, repeat):
+    """
+    :returns: Measurements for a script of size nodes.
+    :rtype: dict
+    """
+    text = generate_script(nodes=size, **parameters)
+    megabytes = len(text) / 1e6
+    tokens = len(lexer.lex_buffer(text, skip_ignored=True))
+    lex_seconds = _best(lambda: lexer.lex_buffer(text, skip_ignored=True), repeat)
+    parse_seconds = _best(lambda: parser.parse(text), repeat)
+    return {
+        "nodes": size,
+        "bytes": len(text),
+        "tokens": tokens,
+        "lex_seconds": lex_seconds,
+        "lex_mb_per_second": megabytes / lex_seconds,
+        "lex_tokens_per_second": tokens / lex_seconds,
+        "parse_seconds": parse_seconds,
+        "parse_mb_per_second": megabytes / parse_seconds,
+        "parse_nodes_per_second": size / parse_seconds,
+        "peak_bytes": _peak_memory(lambda: parser.parse(text)),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    :returns: Description of every measurement more than tolerance worse than baseline.
+    :rtype: list[str]
+    """
+    previous = dict((run["nodes"], run) for run in baseline["runs"])
+    regressions = []
+    for run in results["runs"]:
+        before = previous.get(run["nodes"])
+        if before is None:
+            continue
+        for name in COMPARED:
+            if before[name] and run[name] > before[name] * (1 + tolerance):
+                regressions.append("%d nodes %s: %.4g -> %.4g (%+.0f%%)" % (
+                    run["nodes"], name, before[name], run[name], (run[name] / before[name] - 1) * 100
+                ))
+    return regressions
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.strip().splitlines()[0])
+    arguments.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000, 4000], help="Node counts.")
+    arguments.add_argument("--knobs", type=int, default=6, help="Knobs per node.")
+    arguments.add_argument("--width", type=int, default=4, help="Multi-value width and keys per curve.")
+    arguments.add_argument("--curves", type=float, default=0.1, help="Fraction of animated knob values.")
+    arguments.add_argument("--stack", type=float, default=0.2, help="Fraction of nodes followed by set or push.")
+    arguments.add_argument("--seed", type=int, default=0)
+    arguments.add_argument("--repeat", type=int, default=3, help="Runs per measurement, the best one is kept.")
+    arguments.add_argument("--output", help="JSON file to write the results to.")
+    arguments.add_argument("--baseline", help="JSON results of an earlier run to compare with.")
+    arguments.add_argument("--tolerance", type=float, default=0.1, help="Allowed slowdown, 0.1 is 10%%.")
+    args = arguments.parse_args(argv)
+
+    parameters = {
+        "knobs": args.knobs,
+        "width": args.width,
+        "curves": args.curves,
+        "stack": args.stack,
+        "seed": args.seed,
+    }
+    # Compile the grammar and generate the parser before anything is timed.
+    parser.parse(generate_script(nodes=1, **parameters))
+
+    runs = []
+    for size in args.sizes:
+        run = measure(size, parameters, args.repeat)
+        runs.append(run)
+        print("%7d nodes  lex %7.2f MB/s  parse %7.2f MB/s %9.0f nodes/s  peak %7.1f MB" % (
+            size, run["lex_mb_per_second"], run["parse_mb_per_second"],
+            run["parse_nodes_per_second"], run["peak_bytes"] / 1e6,
+        ))
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+        "runs": runs,
+        "scaling": {
+            "lex": _slope([(run["nodes"], run["lex_seconds"]) for run in runs]),
+            "parse": _slope([(run["nodes"], run["parse_seconds"]) for run in runs]),
+        },
+    }
+    if len(runs) > 1:
+        print("scaling exponent  lex %s  parse %s" % tuple(
+            "n/a" if slope is None else "%.2f" % slope
+            for slope in (results["scaling"]["lex"], results["scaling"]["parse"])
+        ))
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
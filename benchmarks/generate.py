@@ -0,0 +1,73 @@
+"""
+Generate synthetic nukescripts for benchmarking.
+
+Scripts are built from a seeded random generator, so the same parameters always give
+    the same text.
+"""
+import random
+
+NODE_CLASSES = ("Grade", "Blur", "Transform", "ColorCorrect", "Saturation", "Defocus")
+WORDS = ("true", "false", "Lanczos4", "centred", "rgba", "linear")
+
+
+def _number(rng):
+    if rng.random() < 0.5:
+        return str(rng.randint(-2000, 2000))
+    return "%.6f" % rng.uniform(-10, 10)
+
+
+def _curve(rng, width):
+    frame = rng.randint(1, 1001)
+    keys = []
+    for _ in range(max(width, 1)):
+        keys.append("x%d %s" % (frame, _number(rng)))
+        frame += rng.randint(1, 10)
+    return "{{curve %s}}" % " ".join(keys)
+
+
+def _value(rng, width, curves):
+    roll = rng.random()
+    if roll < curves:
+        return _curve(rng, width)
+    if roll < curves + (1 - curves) / 4:
+        return "{%s}" % " ".join(_number(rng) for _ in range(max(width, 1)))
+    if roll < curves + (1 - curves) / 2:
+        return rng.choice(WORDS)
+    return _number(rng)
+
+
+def generate_script(nodes=1000, knobs=6, width=4, curves=0.1, stack=0.2, seed=0):
+    """
+    Build a synthetic nukescript.
+
+    :param nodes: Number of nodes.
+    :type nodes: int
+    :param knobs: Knobs per node, including the name knob.
+    :type knobs: int
+    :param width: Number of values of a multi-value knob and of keys of a curve.
+    :type width: int
+    :param curves: Fraction of knob values that are animated curves.
+    :type curves: float
+    :param stack: Fraction of nodes followed by a set or a push.
+    :type stack: float
+    :param seed: Seed of the random generator.
+    :type seed: int
+    :rtype: str
+    """
+    rng = random.Random(seed)
+    variables = []
+    lines = []
+    for index in range(nodes):
+        node_class = rng.choice(NODE_CLASSES)
+        lines.append("%s {" % node_class)
+        for knob in range(max(knobs, 1) - 1):
+            lines.append(" knob%d %s" % (knob, _value(rng, width, curves)))
+        lines.append(" name %s%d" % (node_class, index))
+        lines.append("}")
+        if rng.random() < stack:
+            if variables and rng.random() < 0.5:
+                lines.append("push $%s" % rng.choice(variables))
+            else:
+                variables.append("N%x" % index)
+                lines.append("set %s [stack 0]" % variables[-1])
+    return "\n".join(lines) + "\n"
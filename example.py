@@ -1,10 +1,7 @@
 from stunning import parser
 from stunning.exceptions import KeyFrameError
 
-with open("example.nk", "r") as fh:
-  nukescript_data = fh.read()
-
-nodes = parser.parse(nukescript_data)
+nodes = parser.parse_file("example.nk")
 
 print("The first node's type is: {}".format(nodes[0].Class))
 print("The value of the 'white' knob at frame 1001 is: {}".format(nodes[0].knobs["white"].valueAt(1001)))
@@ -0,0 +1,19 @@
+# Names re-exported from submodules, imported on first use so importing a submodule
+#   like stunning.lexer does not also load the process pool and the parser.
+_LAZY = {
+    "parse_many": "stunning.batch",
+    "parse_parallel": "stunning.batch",
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+    value = globals()[name] = getattr(importlib.import_module(module), name)
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY))
@@ -0,0 +1,52 @@
+"""
+Parse nukescript files and write one JSON line per file.
+
+    python -m stunning [-j WORKERS] [-o OUTPUT] PATH [PATH ...]
+
+Directories are searched for .nk files. Every line is an object with the "path" of the
+    file, its "nodes" (see NodeObject.to_dict) and an "error", which is null unless the
+    file could not be parsed. The exit status is 1 if any file failed.
+"""
+import argparse
+import json
+import os
+import sys
+
+from stunning.batch import parse_many
+
+NUKESCRIPT_EXTENSION = ".nk"
+
+
+def _expand(paths):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(NUKESCRIPT_EXTENSION):
+                    yield os.path.join(root, name)
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(prog="python -m stunning", description=__doc__.strip().splitlines()[0])
+    arguments.add_argument("paths", nargs="+", metavar="PATH", help="Nukescript file or directory of them.")
+    arguments.add_argument("-j", "--workers", type=int, help="Worker processes, defaults to the CPU count.")
+    arguments.add_argument("-o", "--output", default="-", help="JSON lines file to write, defaults to stdout.")
+    args = arguments.parse_args(argv)
+
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    failed = False
+    try:
+        for result in parse_many(_expand(args.paths), workers=args.workers, as_dicts=True):
+            failed = failed or result.error is not None
+            output.write(json.dumps(result._asdict()) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
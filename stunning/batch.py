@@ -0,0 +1,141 @@
+"""
+Parse nukescript in parallel across a process pool.
+
+parse_many hands whole files to the workers and yields each result as soon as it is
+    done. parse_parallel splits a single script at its top-level nodes and parses the
+    pieces in the workers instead.
+Every worker process compiles the grammar and generates its parser once, when it
+    starts.
+"""
+import bisect
+import collections
+import concurrent.futures
+import os
+
+from stunning import parser
+from stunning.codegen import compiled_parser
+from stunning.exceptions import UnexpectedTokenError
+
+# Files queued per worker, enough to keep every worker busy without queueing every path.
+_QUEUED_PER_WORKER = 4
+# Pieces parse_parallel splits a script into per worker, so a piece full of large nodes
+#   does not leave the other workers idle for long.
+_PIECES_PER_WORKER = 2
+# Smallest piece of a script worth sending to a worker, in characters.
+PARALLEL_CHUNK_SIZE = 1 << 18
+
+FileResult = collections.namedtuple("FileResult", ["path", "nodes", "error"])
+FileResult.__doc__ = """
+Outcome of parsing one file.
+
+nodes is the list parse returned (or their to_dict() data) and error is None, or nodes
+    is None and error describes why the file could not be read or parsed.
+"""
+
+
+def _init_worker():
+    compiled_parser()
+
+
+def _parse_path(path, as_dicts):
+    try:
+        nodes = parser.parse_file(path)
+        if as_dicts:
+            nodes = [node.to_dict() for node in nodes]
+    except Exception as error:
+        # One broken script must not stop the rest of the batch.
+        return FileResult(path, None, "%s: %s" % (type(error).__name__, error))
+    return FileResult(path, nodes, None)
+
+
+def parse_many(paths, workers=None, as_dicts=False):
+    """
+    Parse nukescript files in parallel worker processes.
+
+    :param paths: Paths of the files to parse.
+    :type paths: collections.abc.Iterable[str]
+    :param workers: Number of worker processes, defaults to the number of CPUs.
+        With a single worker the files are parsed in this process.
+    :type workers: int
+    :param as_dicts: Convert the nodes with NodeObject.to_dict in the workers, which is
+        cheaper to send back than the NodeObjects themselves.
+    :type as_dicts: bool
+    :yields: The result of each file, in the order the files finish.
+    :ytype: FileResult
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for path in paths:
+            yield _parse_path(path, as_dicts)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(_parse_path, path, as_dicts))
+            if len(pending) >= workers * _QUEUED_PER_WORKER:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def _split(text, pieces):
+    """
+    :returns: Offsets splitting text into about pieces equal parts, each starting at a
+        top-level node so every part parses on its own.
+    :rtype: list[int]
+    """
+    starts = list(parser._node_starts(text))
+    offsets = [0]
+    for piece in range(1, pieces):
+        index = bisect.bisect_left(starts, len(text) * piece // pieces)
+        if index < len(starts) and starts[index] > offsets[-1]:
+            offsets.append(starts[index])
+    return offsets
+
+
+def parse_parallel(text, workers=None, chunk_size=PARALLEL_CHUNK_SIZE, executor=None):
+    """
+    Parse one large script by splitting it at top-level node boundaries and parsing the
+        pieces in worker processes.
+
+    The nodes come back in source order, each with its own set/push tcl_node, so the
+        list is the same one parse returns.
+
+    :param text: Nukescript source text.
+    :type text: str
+    :param workers: Number of worker processes, defaults to the number of CPUs. With a
+        single worker and no executor the text is parsed in this process.
+    :type workers: int
+    :param chunk_size: Smallest piece worth a worker, in characters. Scripts too small
+        to give every piece this much are parsed in this process.
+    :type chunk_size: int
+    :param executor: Existing concurrent.futures executor to parse the pieces in,
+        instead of starting a process pool for this call.
+    :type executor: concurrent.futures.Executor
+    :rtype: list[NodeObject]
+    :raises UnexpectedTokenError: If the text does not match the grammar.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 and executor is None:
+        return parser.parse(text)
+    pieces = min(workers * _PIECES_PER_WORKER, len(text) // max(chunk_size, 1))
+    offsets = _split(text, pieces) if pieces > 1 else [0]
+    if len(offsets) == 1:
+        return parser.parse(text)
+
+    chunks = [text[start:end] for start, end in zip(offsets, offsets[1:] + [len(text)])]
+    try:
+        if executor is not None:
+            results = list(executor.map(parser.parse, chunks))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+                results = list(pool.map(parser.parse, chunks))
+    except UnexpectedTokenError:
+        # Parse the whole text to report the error at its line and column in it.
+        return parser.parse(text)
+    return [node for nodes in results for node in nodes]
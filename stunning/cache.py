@@ -0,0 +1,180 @@
+import os
+import pickle
+import tempfile
+
+from stunning import constants
+
+# Writes after which a sub directory is scanned again, to pick up what other processes
+#   wrote to it in the meantime.
+RESCAN_WRITES = 256
+# Estimated size in bytes and writes since the last scan, by (cache dir, sub directory).
+_TOTALS = {}
+
+
+def cache_dir():
+    """
+    :returns: Directory for on-disk caches, or None if caching is disabled.
+    :rtype: str | None
+    """
+    path = os.environ.get(constants.CACHE_DIR_ENV_KEY)
+    if path is None:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = os.path.join(base, "stunning")
+    return path or None
+
+
+def load(name, touch=False):
+    """
+    Load a pickled cache entry.
+
+    A missing, unreadable or corrupt entry is treated as a cache miss.
+
+    :param name: File name of the entry inside the cache directory.
+    :type name: str
+    :param touch: Update the modification time of the entry on a hit, which is what
+        evict orders entries by.
+    :type touch: bool
+    :returns: The cached object, or None on a miss.
+    """
+    directory = cache_dir()
+    if not directory:
+        return None
+    path = os.path.join(directory, name)
+    try:
+        with open(path, "rb") as fh:
+            obj = pickle.load(fh)
+    except Exception:
+        return None
+    if touch:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    return obj
+
+
+def dump(name, obj, max_size=None):
+    """
+    Pickle obj into the cache directory.
+
+    The entry is written to a temporary file and renamed into place so concurrent
+        processes never read a partial entry. Failing to write is not an error.
+
+    :param name: File name of the entry inside the cache directory, it may be inside a
+        sub directory.
+    :type name: str
+    :param max_size: Evict the least recently used entries of the entry's directory
+        once they add up to more than this many bytes. The directory is only scanned
+        when a running total of what this process wrote says it is over, or every
+        RESCAN_WRITES writes, so a write does not get slower as the cache grows.
+    :type max_size: int
+    :returns: Whether the entry was written.
+    :rtype: bool
+    """
+    directory = cache_dir()
+    if not directory:
+        return False
+    path = os.path.join(directory, name)
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump(obj, fh, pickle.HIGHEST_PROTOCOL)
+            added = fh.tell()
+        try:
+            added -= os.stat(path).st_size
+        except OSError:
+            pass
+        os.replace(tmp_path, path)
+    except (OSError, pickle.PickleError, RecursionError):
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    if max_size is not None:
+        _account(directory, os.path.dirname(name), added, max_size)
+    return True
+
+
+def _account(directory, subdirectory, added, max_size):
+    key = (directory, subdirectory)
+    total = _TOTALS.get(key)
+    if total is not None and total[1] < RESCAN_WRITES:
+        total[0] += added
+        total[1] += 1
+        if total[0] <= max_size:
+            return
+    _TOTALS[key] = [evict(subdirectory, max_size), 0]
+
+
+def _entries(subdirectory):
+    """
+    :returns: (modification time, size, path, name) of every entry of a cache sub
+        directory, oldest first.
+    :rtype: list[tuple]
+    """
+    directory = cache_dir()
+    if not directory:
+        return []
+    entries = []
+    try:
+        with os.scandir(os.path.join(directory, subdirectory)) as scan:
+            for entry in scan:
+                if entry.name.startswith(".tmp-") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path, entry.name))
+    except OSError:
+        return []
+    entries.sort()
+    return entries
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        # Another process evicted it first.
+        pass
+
+
+def evict(subdirectory, max_size):
+    """
+    Remove the least recently used entries of a cache sub directory until the rest add
+        up to max_size bytes or less.
+
+    Entries are ordered by modification time, which load(name, touch=True) updates.
+
+    :param subdirectory: Sub directory of the cache directory, "" for the cache
+        directory itself.
+    :type subdirectory: str
+    :param max_size: Size in bytes to shrink the entries to.
+    :type max_size: int
+    :returns: Size in bytes of the entries left.
+    :rtype: int
+    """
+    entries = _entries(subdirectory)
+    total = sum(size for _, size, _, _ in entries)
+    for _, size, path, _ in entries:
+        if total <= max_size:
+            break
+        _remove(path)
+        total -= size
+    return total
+
+
+def prune(prefix, keep, subdirectory=""):
+    """
+    Remove all but the keep most recently used entries whose names start with prefix.
+
+    :param prefix: Start of the entry names, "grammar-" for example.
+    :type prefix: str
+    :param keep: Number of entries to keep.
+    :type keep: int
+    :param subdirectory: Sub directory of the cache directory, "" for the cache
+        directory itself.
+    :type subdirectory: str
+    """
+    matching = [path for _, _, path, name in _entries(subdirectory) if name.startswith(prefix)]
+    for path in matching[:max(len(matching) - keep, 0)]:
+        _remove(path)
@@ -0,0 +1,339 @@
+"""
+Generate a recursive-descent parser module from the compiled grammar.
+
+The generated module has one function per grammar rule and one per terminal, with the
+    token kind or literal text it accepts baked in as a constant. Rules dispatch on the
+    next token kind using the FIRST set of each alternative. It resolves exactly
+    the same results as Token.resolve does and hands them to the same Token.reduce
+    overrides, so it is a drop-in replacement for interpreting the grammar tree.
+
+Modules are generated lazily, once per grammar_key, so a change to grammar.bnf or to a
+    STUNNING_BNF_GRAMMAR_FILES plugin grammar produces a fresh parser.
+
+Write the module for the current grammar out with:
+    python -m stunning.codegen [output.py]
+"""
+import linecache
+import re
+import sys
+import types
+
+from stunning import lexer
+from stunning.grammar import build_grammar, build_grammar_key, first_sets, first_set, alternative_first_set
+from stunning.token import Token, OrToken, LiteralToken
+
+# Generated and bound parser modules for this process, keyed by grammar_key.
+_PARSERS = {}
+
+_HEADER = '''\
+# Generated by stunning.codegen from grammar %(key)s.
+# Do not edit, regenerate it with: python -m stunning.codegen
+
+GRAMMAR_KEY = %(key)r
+
+
+def _many(cursor, once):
+    results = []
+    while True:
+        start = cursor.index
+        result = once(cursor)
+        if result is None:
+            cursor.index = start
+            return results or None
+        results.append(result)
+'''
+
+
+class _Generator(object):
+    def __init__(self, grammar, key):
+        super(_Generator, self).__init__()
+        self.grammar = grammar
+        self.key = key
+        self.functions = []
+        self.rule_names = {}
+        self.helper_names = {}
+        self.reducers = {}
+        self.constants = []
+        self.rule_firsts = first_sets(grammar)
+        self._taken = set()
+
+    def _function_name(self, prefix, name):
+        base = "%s_%s" % (prefix, re.sub(r"\W", "_", name))
+        function_name = base
+        count = 1
+        while function_name in self._taken:
+            function_name = "%s_%d" % (base, count)
+            count += 1
+        self._taken.add(function_name)
+        return function_name
+
+    def _once(self, token):
+        """
+        :returns: Name of the generated function resolving token a single time.
+        """
+        if token.is_rule:
+            return self.rule_names[token.name]
+        if isinstance(token, OrToken):
+            return self._or(token)
+        if isinstance(token, LiteralToken):
+            return self._literal(token.text)
+        return self._kind(token.name)
+
+    def _element(self, token):
+        """
+        :returns: (call resolving token, whether the call already returns a list of results)
+        """
+        once = self._once(token)
+        if token.greedy:
+            return "_many(cursor, %s)" % once, True
+        return "%s(cursor)" % once, False
+
+    def _kind(self, name):
+        key = ("_kind", name)
+        if key not in self.helper_names:
+            function_name = self.helper_names[key] = self._function_name("_kind", name)
+            accepted = set(lexer.accepted_kinds(name))
+            self.functions.append(
+                "def %(name)s(cursor):\n"
+                "    index = cursor.index\n"
+                "    kinds = cursor.kinds\n"
+                "    if index < len(kinds) and kinds[index] %(test)s %(kind)s:\n"
+                "        cursor.index = index + 1\n"
+                "        return cursor.tokens[index]\n"
+                "    cursor.expect(%(expectation)r)\n"
+                "    return None\n" % {
+                    "name": function_name,
+                    "test": "==" if len(accepted) == 1 else "in",
+                    "kind": self._kinds(accepted),
+                    "expectation": name,
+                }
+            )
+        return self.helper_names[key]
+
+    def _literal(self, text):
+        key = ("_literal", text)
+        if key not in self.helper_names:
+            function_name = self.helper_names[key] = self._function_name("_literal", text)
+            self.functions.append(
+                "def %(name)s(cursor):\n"
+                "    index = cursor.index\n"
+                "    if index < len(cursor.kinds):\n"
+                "        token = cursor.tokens[index]\n"
+                "        if token.value == %(text)r:\n"
+                "            cursor.index = index + 1\n"
+                "            return token\n"
+                "    cursor.expect(%(expectation)r)\n"
+                "    return None\n" % {
+                    "name": function_name,
+                    "text": text,
+                    "expectation": repr(text),
+                }
+            )
+        return self.helper_names[key]
+
+    def _kinds(self, kinds):
+        """
+        :param kinds: Token names.
+        :returns: Name of the constant holding the kind id of a single name, or a
+            frozenset of the kind ids of several.
+        """
+        ids = lexer.kind_ids()
+        if len(kinds) == 1:
+            name = next(iter(kinds))
+            key = ("KIND", name)
+            if key not in self.helper_names:
+                self.helper_names[key] = "KIND_%s" % name
+                self.constants.append("KIND_%s = %d\n" % (name, ids[name]))
+            return self.helper_names[key]
+        return self._constant("_FIRST", sorted(ids[name] for name in kinds))
+
+    def _names(self, kinds):
+        """
+        :returns: Name of a frozenset constant of the token names kinds.
+        """
+        return self._constant("_EXPECT", sorted(kinds))
+
+    def _constant(self, prefix, values):
+        key = (prefix, tuple(values))
+        if key not in self.helper_names:
+            name = self.helper_names[key] = self._function_name(prefix, str(len(self.constants)))
+            self.constants.append("%s = frozenset(%r)\n" % (name, values))
+        return self.helper_names[key]
+
+    def _alternatives(self, name, alternatives, firsts, reducer=None):
+        """
+        Alternatives are only tried when the next token kind is in their FIRST set, each
+            element is resolved in turn and the first one to return None abandons the
+            alternative and rewinds the cursor.
+        Consecutive alternatives starting with the same elements share them, so the two
+            node alternatives resolve the node once and only differ in the trailer.
+        """
+        lines = [
+            "def %s(cursor):" % name,
+            "    start = cursor.index",
+            "    kinds = cursor.kinds",
+            "    kind = kinds[start] if start < len(kinds) else None",
+        ]
+        groups = []
+        for index, alternative in enumerate(alternatives):
+            kinds = firsts[index]
+            if not alternative or not kinds:
+                # An empty option never resolves, Token.resolve skips its empty result too.
+                continue
+            if groups and groups[-1][1][-1][0] == alternative[0]:
+                groups[-1][1].append(alternative)
+            else:
+                groups.append((kinds, [alternative]))
+        for kinds, members in groups:
+            if len(kinds) == 1:
+                lines.append("    if kind == %s:" % self._kinds(kinds))
+            else:
+                lines.append("    if kind in %s:" % self._kinds(kinds))
+            self._branches(lines, members, 0, "        ", [], reducer)
+            lines.append("        cursor.index = start")
+        every_kind = frozenset().union(*firsts)
+        if len(every_kind) == 1:
+            lines.append("    cursor.expect(%r)" % next(iter(every_kind)))
+        elif every_kind:
+            lines.append("    cursor.expect_any(%s)" % self._names(every_kind))
+        lines.append("    return None")
+        return "\n".join(lines) + "\n"
+
+    def _branches(self, lines, alternatives, position, indent, parts, reducer):
+        """
+        Emit alternatives that share their first position elements, grouping them again
+            by the element that follows.
+        """
+        groups = []
+        for alternative in alternatives:
+            element = alternative[position] if position < len(alternative) else None
+            if groups and groups[-1][0] == element:
+                groups[-1][1].append(alternative)
+            else:
+                groups.append((element, [alternative]))
+
+        for number, (element, members) in enumerate(groups):
+            if element is None:
+                expression = "[%s]" % ", ".join(parts)
+                if reducer:
+                    expression = "%s(%s, cursor)" % (reducer, expression)
+                lines.append("%sreturn %s" % (indent, expression))
+                # Any alternative after a complete one is never reached.
+                return
+            last = number == len(groups) - 1
+            if position and not last:
+                lines.append("%smark%d = cursor.index" % (indent, position))
+            call, is_list = element
+            variable = "e%d" % position
+            lines.append("%s%s = %s" % (indent, variable, call))
+            lines.append("%sif %s is not None:" % (indent, variable))
+            self._branches(
+                lines, members, position + 1, indent + "    ",
+                parts + [variable if is_list else "[%s]" % variable], reducer,
+            )
+            if position and not last:
+                lines.append("%scursor.index = mark%d" % (indent, position))
+
+    def _or(self, token):
+        options = [[self._element(option)] for option in token.values]
+        key = ("_or", tuple(map(tuple, options)))
+        if key not in self.helper_names:
+            name = self.helper_names[key] = self._function_name("_or", str(len(self.helper_names)))
+            firsts = [first_set(option, self.rule_firsts) for option in token.values]
+            self.functions.append(self._alternatives(name, options, firsts))
+        return self.helper_names[key]
+
+    def generate(self):
+        for rule_name in self.grammar:
+            self.rule_names[rule_name] = self._function_name("rule", rule_name)
+            if rule_name in Token._TokenClasses:
+                self.reducers[rule_name] = self._function_name("_reduce", rule_name)
+
+        for rule_name, alternatives in self.grammar.items():
+            self.functions.append(self._alternatives(
+                self.rule_names[rule_name],
+                [[self._element(token) for token in alternative] for alternative in alternatives],
+                [alternative_first_set(alternative, self.rule_firsts) for alternative in alternatives],
+                reducer=self.reducers.get(rule_name),
+            ))
+
+        main = ["%s(cursor)" % self._once(token) for token in self.grammar["main"][0]]
+        self.functions.append(
+            "def parse(cursor):\n"
+            "    return [%s]\n" % ", ".join(main)
+        )
+
+        bind = ["def bind(token_classes):"]
+        if self.reducers:
+            bind.append("    global %s" % ", ".join(sorted(self.reducers.values())))
+        for rule_name, reducer in sorted(self.reducers.items()):
+            bind.append("    %s = token_classes[%r](%r, None).reduce" % (reducer, rule_name, rule_name))
+        bind.append("    return parse")
+        self.functions.append("\n".join(bind) + "\n")
+
+        rules = "".join("    %r: %s,\n" % item for item in sorted(self.rule_names.items()))
+        self.functions.append("RULES = {\n%s}\n" % rules)
+
+        placeholders = "".join("%s = None\n" % name for name in sorted(self.reducers.values()))
+        placeholders += "".join(self.constants)
+        return "\n\n".join(
+            [_HEADER % {"key": self.key} + "\n\n" + placeholders] + self.functions
+        )
+
+
+def generate(grammar, key=""):
+    """
+    Generate the source of a parser module for grammar.
+
+    The module exposes bind(token_classes), which attaches the reduce methods of the
+        Token classes registered for rules and returns parse(cursor). parse resolves the
+        "main" rule from a TokenCursor and returns the same list the interpreted grammar
+        produces. Like Token.resolve, failures are returned as None and recorded on the
+        cursor rather than raised.
+    RULES maps every rule name to the function resolving that rule on its own.
+
+    :param grammar: Compiled grammar as returned by build_grammar.
+    :type grammar: dict
+    :param key: grammar_key recorded in the generated module.
+    :type key: str
+    :rtype: str
+    """
+    return _Generator(grammar, key).generate()
+
+
+def compiled_parser(rule="main"):
+    """
+    Generate, compile and bind the parser for the current grammar, once per grammar_key.
+
+    :param rule: Grammar rule to resolve. The "main" function returns the list of its
+        elements, any other rule function returns the reduced result of that rule.
+    :type rule: str
+    :returns: The generated function taking a TokenCursor.
+    :rtype: types.FunctionType
+    """
+    key = build_grammar_key()
+    module = _PARSERS.get(key)
+    if module is None:
+        source = generate(build_grammar(), key)
+        filename = "<stunning generated parser %s>" % key
+        # Let tracebacks through the generated code show its source lines.
+        linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+        module = types.ModuleType("stunning._generated_parser")
+        exec(compile(source, filename, "exec"), module.__dict__)
+        module.bind(Token._TokenClasses)
+        _PARSERS[key] = module
+    if rule == "main":
+        return module.parse
+    return module.RULES[rule]
+
+
+if __name__ == "__main__":
+    # The parser registers the Token classes that the generated module binds to.
+    from stunning import parser  # noqa: F401
+
+    output = generate(build_grammar(), build_grammar_key())
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "w") as fh:
+            fh.write(output)
+    else:
+        sys.stdout.write(output)
@@ -20,3 +20,43 @@ ID = "ID"
 #       Separated with os.pathsep.
 #       Full paths are expected.
 GRAMMAR_PLUGIN_ENV_KEY = "STUNNING_BNF_GRAMMAR_FILES"
+
+# Maximum number of (rule, position) results kept by the packrat parser.
+PACKRAT_MEMO_SIZE = 4096
+
+# Environment key for the directory stunning caches compiled data in.
+#       Defaults to $XDG_CACHE_HOME/stunning (or ~/.cache/stunning).
+#       Set it to an empty string to disable the on-disk cache.
+CACHE_DIR_ENV_KEY = "STUNNING_CACHE_DIR"
+
+# Number of compiled grammars kept in the on-disk cache.
+#       Every change to the grammar files or the grammar code compiles a new one, the
+#       least recently used are removed. More than one is kept for processes using
+#       different STUNNING_BNF_GRAMMAR_FILES plugins.
+GRAMMAR_CACHE_ENTRIES = 4
+
+# Environment key for the most bytes of parse results kept in the on-disk cache.
+#       The least recently used results are evicted past it.
+PARSE_CACHE_SIZE_ENV_KEY = "STUNNING_PARSE_CACHE_SIZE"
+PARSE_CACHE_SIZE = 256 * 1024 * 1024
+
+# Number of inputs a node takes from the stack when it has no "inputs" knob.
+#       Nuke only writes the inputs knob when it differs from the class default,
+#       every class not listed here defaults to 1.
+DEFAULT_NODE_INPUTS = {
+    "BackdropNode": 0,
+    "CheckerBoard2": 0,
+    "ColorBars": 0,
+    "ColorWheel": 0,
+    "Constant": 0,
+    "Copy": 2,
+    "Dissolve": 2,
+    "Keymix": 3,
+    "Merge": 2,
+    "Merge2": 2,
+    "Read": 0,
+    "Root": 0,
+    "ShuffleCopy": 2,
+    "StickyNote": 0,
+    "Switch": 2,
+}
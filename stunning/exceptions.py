@@ -16,3 +16,60 @@ class LexerError(StunningError, BufferError):
 
 class KeyFrameError(StunningError):
     """Error related to keyframe values"""
+
+
+class StackError(StunningError):
+    """Error while replaying the set and push commands of a script."""
+
+
+class UnexpectedTokenError(ParsingError):
+    """
+    Syntax error at the furthest token the parser was able to reach.
+
+    Only the failing token and the set of token kinds that would have been accepted are
+        recorded while parsing, the line, column and message are worked out on demand.
+    """
+
+    def __init__(self, text, token, expected):
+        super(UnexpectedTokenError, self).__init__()
+        # The parsed text, None when it was streamed and not kept.
+        self.text = text
+        # The LexToken that was rejected, None if the text ended too early.
+        self.token = token
+        self.expected = frozenset(expected)
+
+    def __reduce__(self):
+        return self.__class__, (self.text, self.token, self.expected)
+
+    @property
+    def offset(self):
+        if self.token is None:
+            return None if self.text is None else len(self.text)
+        return self.token.position[0]
+
+    @property
+    def line(self):
+        if self.text is None:
+            return None
+        return self.text.count("\n", 0, self.offset) + 1
+
+    @property
+    def column(self):
+        if self.text is None:
+            return None
+        return self.offset - self.text.rfind("\n", 0, self.offset)
+
+    def __str__(self):
+        if self.token is None:
+            found = "end of text"
+        else:
+            found = "%s %r" % (self.token.name, self.token.value)
+        if self.text is not None:
+            message = "Unexpected %s at line %d, column %d" % (found, self.line, self.column)
+        elif self.token is not None:
+            message = "Unexpected %s at offset %d" % (found, self.offset)
+        else:
+            message = "Unexpected %s" % found
+        if self.expected:
+            message += ", expected %s" % " or ".join(sorted(self.expected))
+        return message
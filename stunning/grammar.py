@@ -1,8 +1,15 @@
+import hashlib
 import os
+import sys
 
-from stunning.lexer import TOKEN_NAMES
+from stunning import cache, lexer
 from stunning.token import Token, OrToken, OneOrMoreToken, LiteralToken
-from stunning.constants import ONE_OR_MORE, OR, GRAMMAR_PLUGIN_ENV_KEY
+from stunning.constants import ONE_OR_MORE, OR, GRAMMAR_PLUGIN_ENV_KEY, GRAMMAR_CACHE_ENTRIES
+
+# Compiled grammars for this process, keyed by the grammar file paths.
+_GRAMMARS = {}
+# grammar_key of the grammar files for this process, keyed by the grammar file paths.
+_KEYS = {}
 
 
 def _merge_complex_tokens(tokens):
@@ -37,6 +44,7 @@ def _resolve_grammar(token_names, parts):
             for option in options:
                 values.append(_resolve_grammar(token_names, option))
             created_token = Token.factory(name=part, values=values)
+            created_token.is_rule = True
             # while values:
             #     created_token.values.append(values.pop(0))
         else:
@@ -47,26 +55,63 @@ def _resolve_grammar(token_names, parts):
             elif part[0] in ["\"", "\'"] and part[-1] in ["\"", "\'"]:
                 created_token = LiteralToken(value=part)
             else:
-                created_token = Token.factory(name=part, values=[TOKEN_NAMES.get(part)])
+                created_token = Token.factory(name=part, values=[lexer.token_names().get(part)])
         created_tokens.append(created_token)
     return _merge_complex_tokens(created_tokens)
 
 
-def _load_grammar():
+def _grammar_paths():
     paths = [os.path.join(os.path.dirname(__file__), "grammar.bnf")]
     plugin_paths = os.environ.get(GRAMMAR_PLUGIN_ENV_KEY, "").split(os.pathsep)
     paths += filter(bool, plugin_paths)
+    return tuple(paths)
 
-    grammar = {}
+
+def _read_sources(paths):
+    sources = []
     for path in paths:
         with open(path, "r") as fh:
-            data = fh.readlines()
-        _grammar = _build_grammar(data)
+            sources.append(fh.read())
+    return sources
+
+
+def _load_grammar(sources):
+    grammar = {}
+    for data in sources:
+        _grammar = _build_grammar(data.splitlines())
         if _grammar:
             grammar.update(_grammar)
     return grammar
 
 
+def grammar_key(sources):
+    """
+    Hash everything a compiled grammar depends on.
+
+    That is the content of the grammar files, the token table, the Token classes
+        registered for rules, and the source of the modules those classes live in.
+
+    :param sources: Contents of the grammar files, base grammar first.
+    :type sources: list[str]
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    for data in sources:
+        digest.update(hashlib.sha256(data.encode("utf-8")).digest())
+
+    modules = {Token.__module__, __name__}
+    for name in sorted(Token._TokenClasses):
+        klass = Token._TokenClasses[name]
+        modules.add(klass.__module__)
+        digest.update(("%s=%s.%s" % (name, klass.__module__, klass.__name__)).encode("utf-8"))
+    dependencies = [os.path.join(os.path.dirname(__file__), lexer.TOKENS_FP)]
+    dependencies += [getattr(sys.modules[module], "__file__", None) for module in sorted(modules)]
+    for path in filter(bool, dependencies):
+        with open(path, "rb") as fh:
+            digest.update(hashlib.sha256(fh.read()).digest())
+    return digest.hexdigest()
+
+
 def _build_grammar(grammar_lines):
     token_names = {}
     _TOK = "::= "
@@ -105,8 +150,8 @@ def _build_grammar(grammar_lines):
     return token_names
 
 
-def build_grammar():
-    token_names = _load_grammar()
+def _compile_grammar(sources):
+    token_names = _load_grammar(sources)
 
     resolved_tokens = {}
     for token_name in token_names:
@@ -117,4 +162,170 @@ def build_grammar():
             resolved_parts = _resolve_grammar(token_names, expr_parts)
             resolved_tokens[token_name].append(resolved_parts)
 
+    _attach_predictions(resolved_tokens, first_sets(resolved_tokens))
     return resolved_tokens
+
+
+def _literal_kind(text):
+    tokens = lexer.lex(text, skip_ignored=True)
+    if len(tokens) == 1:
+        return tokens[0].name
+    return None
+
+
+def first_set(token, rule_firsts):
+    """
+    FIRST set of a grammar token: the token kinds the next LexToken can have for token
+        to resolve.
+
+    :param token: Element of a rule alternative.
+    :type token: Token
+    :param rule_firsts: FIRST set of each rule, as returned by first_sets.
+    :type rule_firsts: dict
+    :rtype: frozenset
+    """
+    if token.is_rule:
+        return rule_firsts.get(token.name, frozenset())
+    if isinstance(token, OrToken):
+        return frozenset().union(*[first_set(value, rule_firsts) for value in token.values])
+    if isinstance(token, LiteralToken):
+        return frozenset(filter(None, [_literal_kind(token.text)]))
+    return frozenset(lexer.accepted_kinds(token.name))
+
+
+def alternative_first_set(alternative, rule_firsts):
+    """
+    Every element of an alternative must consume at least one token (an empty option never
+        resolves), so an alternative's FIRST set is the FIRST set of its first element.
+    """
+    if not alternative:
+        return frozenset()
+    return first_set(alternative[0], rule_firsts)
+
+
+def first_sets(grammar):
+    """
+    :param grammar: Compiled grammar as returned by build_grammar.
+    :type grammar: dict
+    :returns: Mapping of rule name to the FIRST set of the rule.
+    :rtype: dict
+    """
+    firsts = {}
+
+    def token_first(token):
+        if token.is_rule:
+            return rule_first(token.name)
+        if isinstance(token, OrToken):
+            return frozenset().union(*[token_first(value) for value in token.values])
+        return first_set(token, firsts)
+
+    def rule_first(name):
+        if name not in firsts:
+            # Left recursive rules can not be resolved anyway, this just stops the recursion.
+            firsts[name] = frozenset()
+            firsts[name] = frozenset().union(*[
+                token_first(alternative[0]) for alternative in grammar.get(name, []) if alternative
+            ])
+        return firsts[name]
+
+    for name in grammar:
+        rule_first(name)
+    return firsts
+
+
+def _prediction_table(first_per_option):
+    table = {}
+    for index, kinds in enumerate(first_per_option):
+        for kind in kinds:
+            table.setdefault(kind, []).append(index)
+    return dict((kind, tuple(indexes)) for kind, indexes in table.items())
+
+
+def _attach_predictions(grammar, rule_firsts):
+    """
+    Give every rule and Or token a table from the next token kind to the options that
+        can start with it, so Token.resolve only tries viable options.
+    """
+    rule_tables = {}
+    for name, alternatives in grammar.items():
+        rule_tables[name] = _prediction_table(
+            [alternative_first_set(alternative, rule_firsts) for alternative in alternatives]
+        )
+
+    seen = set()
+    pending = [token for alternatives in grammar.values() for alternative in alternatives for token in alternative]
+    while pending:
+        token = pending.pop()
+        if id(token) in seen:
+            continue
+        seen.add(id(token))
+        if token.is_rule:
+            token.predict = rule_tables.get(token.name)
+            pending.extend(value for alternative in token.values for value in alternative)
+        elif isinstance(token, OrToken):
+            token.predict = _prediction_table([first_set(value, rule_firsts) for value in token.values])
+            pending.extend(token.values)
+
+
+def _compiled():
+    paths = _grammar_paths()
+    compiled = _GRAMMARS.get(paths)
+    if compiled is None:
+        key = build_grammar_key()
+        cache_name = "grammar-%s.pickle" % key
+        grammar = cache.load(cache_name, touch=True)
+        if grammar is None:
+            grammar = _compile_grammar(_read_sources(paths))
+            if cache.dump(cache_name, grammar):
+                cache.prune("grammar-", GRAMMAR_CACHE_ENTRIES)
+        compiled = _GRAMMARS[paths] = (key, grammar)
+    return compiled
+
+
+def build_grammar():
+    """
+    Build the grammar from grammar.bnf and any STUNNING_BNF_GRAMMAR_FILES plugins.
+
+    The grammar is compiled once per process for a given set of grammar files.
+    Compiled grammars are also pickled into the on-disk cache (see stunning.cache),
+        keyed by grammar_key, so new processes can skip compiling it. Only the
+        GRAMMAR_CACHE_ENTRIES most recently used grammars are kept.
+
+    :returns: Mapping of rule name to its alternatives.
+    :rtype: dict
+    """
+    return _compiled()[1]
+
+
+def build_grammar_key():
+    """
+    The grammar_key of the grammar build_grammar returns, worked out without building
+        or loading the grammar itself.
+
+    :rtype: str
+    """
+    paths = _grammar_paths()
+    key = _KEYS.get(paths)
+    if key is None:
+        key = _KEYS[paths] = grammar_key(_read_sources(paths))
+    return key
+
+
+def rule_token(name):
+    """
+    Build a Token resolving the grammar rule called name on its own, with its
+        predictions attached.
+
+    :param name: Rule name, like "node" or "value".
+    :type name: str
+    :rtype: Token
+    :raises KeyError: If the grammar has no such rule.
+    """
+    grammar = build_grammar()
+    token = Token.factory(name=name, values=grammar[name])
+    token.is_rule = True
+    rule_firsts = first_sets(grammar)
+    token.predict = _prediction_table(
+        [alternative_first_set(alternative, rule_firsts) for alternative in grammar[name]]
+    )
+    return token
@@ -0,0 +1,152 @@
+"""
+Build the node graph of a parsed script by replaying the Nuke stack.
+
+A nukescript does not name the inputs of a node, every node takes its inputs off a
+    stack and then pushes itself onto it. "set VAR [stack N]" saves the node N deep in
+    the stack under VAR and "push $VAR" pushes it again. NodeGraph replays that in one
+    pass over the parsed nodes.
+
+Because inputs must be on the stack before a node that uses them, script order is
+    already a topological order of the graph.
+"""
+import collections
+
+from stunning import constants
+from stunning.exceptions import StackError
+from stunning.objects import SetTCLObject, PushTCLObject
+
+
+def node_inputs(node):
+    """
+    :returns: Number of inputs node takes from the stack.
+    :rtype: int
+    """
+    if "inputs" in node.knobs:
+        return int(node.knobs["inputs"])
+    return constants.DEFAULT_NODE_INPUTS.get(node.Class, 1)
+
+
+class NodeGraph(object):
+    """
+    Directed acyclic graph of the nodes of a script.
+
+    Nodes are stored by their position in the script, with a list of input positions
+        and a list of output positions for each, so looking up either direction is a
+        list index. Nodes are looked up by their "name" knob in a dict.
+    """
+
+    def __init__(self, nodes):
+        """
+        :param nodes: Nodes in script order, as parse returns them.
+        :type nodes: list[NodeObject]
+        :raises StackError: If a push names a variable that was never set.
+        """
+        super(NodeGraph, self).__init__()
+        self.nodes = list(nodes)
+        self._positions = {}
+        self._names = {}
+        # Input positions of each node, input 0 first. None is an unconnected input.
+        self._inputs = []
+        self._outputs = [[] for _ in self.nodes]
+        self._replay()
+
+    def _replay(self):
+        stack = []
+        variables = {}
+        for position, node in enumerate(self.nodes):
+            self._positions[node] = position
+            name = node.knobs.get("name")
+            if name is not None:
+                self._names[name] = position
+
+            count = node_inputs(node)
+            # The top of the stack is input 0.
+            inputs = [stack.pop() if stack else None for _ in range(count)]
+            self._inputs.append(inputs)
+            for upstream in inputs:
+                if upstream is not None:
+                    self._outputs[upstream].append(position)
+            stack.append(position)
+
+            tcl_node = node.tcl_node
+            if isinstance(tcl_node, SetTCLObject):
+                depth = int(tcl_node.stackpost)
+                variables[tcl_node.varname] = stack[-1 - depth] if depth < len(stack) else None
+            elif isinstance(tcl_node, PushTCLObject):
+                if tcl_node.varname not in variables:
+                    raise StackError("push of $%s before it was set" % tcl_node.varname)
+                stack.append(variables[tcl_node.varname])
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __iter__(self):
+        """
+        :yields: Nodes in topological order, every node after all of its inputs.
+        """
+        return iter(self.nodes)
+
+    def __contains__(self, node):
+        return node in self._names or node in self._positions
+
+    def _position(self, node):
+        if isinstance(node, str):
+            return self._names[node]
+        return self._positions[node]
+
+    def node(self, name):
+        """
+        :param name: Value of the node's "name" knob.
+        :type name: str
+        :rtype: NodeObject
+        :raises KeyError: If no node has that name.
+        """
+        return self.nodes[self._names[name]]
+
+    def inputs(self, node):
+        """
+        :param node: A node of the graph or its name.
+        :type node: NodeObject | str
+        :returns: The node connected to each input, input 0 first, None where an input is
+            not connected.
+        :rtype: list[NodeObject]
+        """
+        return [None if p is None else self.nodes[p] for p in self._inputs[self._position(node)]]
+
+    def outputs(self, node):
+        """
+        :param node: A node of the graph or its name.
+        :type node: NodeObject | str
+        :returns: The nodes using node as an input, in script order.
+        :rtype: list[NodeObject]
+        """
+        return [self.nodes[p] for p in self._outputs[self._position(node)]]
+
+    def _walk(self, node, edges):
+        start = self._position(node)
+        seen = {start}
+        queue = collections.deque([start])
+        while queue:
+            for position in edges[queue.popleft()]:
+                if position is not None and position not in seen:
+                    seen.add(position)
+                    queue.append(position)
+                    yield self.nodes[position]
+
+    def upstream(self, node):
+        """
+        :param node: A node of the graph or its name.
+        :type node: NodeObject | str
+        :yields: Every node node depends on, nearest first.
+        :ytype: NodeObject
+        """
+        return self._walk(node, self._inputs)
+
+    def downstream(self, node):
+        """
+        :param node: A node of the graph or its name.
+        :type node: NodeObject | str
+        :yields: Every node depending on node, nearest first.
+        :ytype: NodeObject
+        """
+        return self._walk(node, self._outputs)
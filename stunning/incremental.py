@@ -0,0 +1,220 @@
+"""
+Reparse a script after small edits without parsing all of it again.
+
+ParseState remembers the text of every top-level node next to its NodeObject. An edit
+    only reparses the nodes whose text it touches; every other NodeObject is reused as
+    it is.
+
+Nodes are kept in blocks of BLOCK_SIZE, each with the total length of its text, so an
+    edit finds its nodes by walking the block lengths and only copies the blocks it
+    touches. No offset after the edit is shifted and the text is not joined back
+    together until it is read, which keeps the cost of an edit close to flat as the
+    script grows.
+"""
+import itertools
+
+from stunning import parser
+from stunning.exceptions import UnexpectedTokenError
+
+# Nodes per block of a ParseState.
+BLOCK_SIZE = 64
+
+
+def _blocks(items):
+    return [items[index:index + BLOCK_SIZE] for index in range(0, len(items), BLOCK_SIZE)]
+
+
+class ParseState(object):
+    """
+    Parsed text, its nodes and the text of each node.
+
+    A node's text runs from its start up to the start of the next node, so it includes
+        its set/push trailer and the whitespace after it. The first node's text also
+        holds whatever comes before it.
+    text, nodes and starts are joined from the blocks the first time they are read.
+    """
+
+    def __init__(self, texts, nodes, sizes=None, text=None):
+        """
+        :param texts: Blocks of node texts, or None when the brace scan does not agree
+            with the grammar and every edit reparses all of text.
+        :type texts: list[list[str]] | None
+        :param nodes: Blocks of the NodeObjects of texts.
+        :type nodes: list[list[NodeObject]]
+        :param sizes: Total length of each block of texts.
+        :type sizes: list[int]
+        :param text: The whole text, required when texts is None.
+        :type text: str
+        """
+        super(ParseState, self).__init__()
+        self._texts = texts
+        self._nodes = nodes
+        if sizes is None and texts is not None:
+            sizes = [sum(map(len, block)) for block in texts]
+        self._sizes = sizes
+        self._text = text
+        self._flat_nodes = None
+        self._starts = None
+
+    def __repr__(self):
+        return "<ParseState of %d nodes>" % len(self.nodes)
+
+    @property
+    def text(self):
+        if self._text is None:
+            self._text = "".join(itertools.chain.from_iterable(self._texts))
+        return self._text
+
+    @property
+    def nodes(self):
+        if self._flat_nodes is None:
+            self._flat_nodes = list(itertools.chain.from_iterable(self._nodes))
+        return self._flat_nodes
+
+    @property
+    def starts(self):
+        """
+        :returns: Offset each node starts at, None when every edit reparses all of the text.
+        :rtype: list[int] | None
+        """
+        if self._texts is None:
+            return None
+        if self._starts is None:
+            starts = []
+            position = 0
+            for node_text in itertools.chain.from_iterable(self._texts):
+                starts.append(position)
+                position += len(node_text)
+            self._starts = starts
+        return self._starts
+
+    def span(self, index):
+        """
+        :returns: (start, end) offsets of the text of the node at index.
+        :rtype: tuple[int, int]
+        """
+        starts = self.starts
+        end = starts[index + 1] if index + 1 < len(starts) else len(self.text)
+        return starts[index], end
+
+    def _locate(self, offset):
+        """
+        :returns: (block index, index in the block, start offset) of the node whose text
+            holds offset, the last node for offsets past the end.
+        :rtype: tuple[int, int, int]
+        """
+        position = 0
+        last_block = len(self._sizes) - 1
+        for block, size in enumerate(self._sizes):
+            if offset < position + size or block == last_block:
+                texts = self._texts[block]
+                for index, node_text in enumerate(texts):
+                    if offset < position + len(node_text) or index == len(texts) - 1:
+                        return block, index, position
+                    position += len(node_text)
+            position += size
+        raise IndexError(offset)
+
+
+def _split(text):
+    """
+    :returns: The text of each node of text, None if there are no nodes.
+    :rtype: list[str] | None
+    """
+    starts = list(parser._node_starts(text))
+    if not starts:
+        return None
+    # Whatever is in front of the first node is part of it.
+    starts[0] = 0
+    return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+
+def parse(text):
+    """
+    Parse text and keep what reparse needs to parse edits of it.
+
+    :param text: Nukescript source text.
+    :type text: str
+    :rtype: ParseState
+    :raises UnexpectedTokenError: If the text does not match the grammar.
+    """
+    nodes = parser.parse(text)
+    texts = _split(text) or []
+    if len(texts) != len(nodes):
+        # The brace scan does not agree with the grammar, so every edit reparses it all.
+        return ParseState(None, [nodes], text=text)
+    return ParseState(_blocks(texts), _blocks(nodes), text=text)
+
+
+def _apply(state, start, end, replacement):
+    if state._texts is None or not state._sizes:
+        return parse(state.text[:start] + replacement + state.text[end:])
+
+    # The node in front of the edit is included, an edit at the very start of a node may
+    #   just as well extend the trailer of the one before it.
+    first_block, first, region_start = state._locate(max(start - 1, 0))
+    last_block, last, _ = state._locate(end)
+
+    # The blocks around the edited ones are included too, so the whitespace left by
+    #   deleting nodes always has a neighbour to join.
+    low = max(first_block - 1, 0)
+    high = min(last_block + 1, len(state._sizes) - 1)
+    texts = list(itertools.chain.from_iterable(state._texts[low:high + 1]))
+    nodes = list(itertools.chain.from_iterable(state._nodes[low:high + 1]))
+    first += sum(len(block) for block in state._texts[low:first_block])
+    last += sum(len(block) for block in state._texts[low:last_block])
+
+    old_region = "".join(texts[first:last + 1])
+    region = old_region[:start - region_start] + replacement + old_region[end - region_start:]
+    new_texts = _split(region) if region.strip() else None
+    if new_texts is None:
+        if region.strip():
+            # Text without a node, the grammar reports why.
+            return parse(state.text[:start] + replacement + state.text[end:])
+        new_nodes = []
+        new_texts = []
+    else:
+        try:
+            new_nodes = parser.parse(region)
+        except UnexpectedTokenError:
+            # The edit may have moved a node boundary out of the region, parse it all to
+            #   find out, which also reports the error against the whole text.
+            return parse(state.text[:start] + replacement + state.text[end:])
+        if len(new_texts) != len(new_nodes):
+            return parse(state.text[:start] + replacement + state.text[end:])
+
+    texts[first:last + 1] = new_texts
+    nodes[first:last + 1] = new_nodes
+    if not new_texts:
+        if not texts:
+            return parse(region)
+        # Only whitespace is left of the region, it joins the node in front of it.
+        if first:
+            texts[first - 1] += region
+        else:
+            texts[0] = region + texts[0]
+
+    blocks = _blocks(texts)
+    return ParseState(
+        state._texts[:low] + blocks + state._texts[high + 1:],
+        state._nodes[:low] + _blocks(nodes) + state._nodes[high + 1:],
+        state._sizes[:low] + [sum(map(len, block)) for block in blocks] + state._sizes[high + 1:],
+    )
+
+
+def reparse(state, edits):
+    """
+    Apply edits to the text of state and reparse only the nodes they touch.
+
+    :param state: State of the text before the edits.
+    :type state: ParseState
+    :param edits: (start, end, replacement) edits, each replacing state.text[start:end]
+        with replacement. Every edit is in the offsets of the text the edits before it
+        produced, the way an editor reports a sequence of changes.
+    :type edits: collections.abc.Iterable[tuple[int, int, str]]
+    :rtype: ParseState
+    :raises UnexpectedTokenError: If the edited text does not match the grammar.
+    """
+    for start, end, replacement in edits:
+        state = _apply(state, start, end, replacement)
+    return state
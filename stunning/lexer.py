@@ -1,15 +1,31 @@
+import array
 import collections
 import os
 import re
-import sys
+from collections.abc import Sequence
 
+from stunning import constants
 from stunning.exceptions import LexerError
 
-__all__ = ("TOKEN_NAMES", "lex")
+__all__ = ("TOKEN_NAMES", "LexToken", "TokenBuffer", "lex", "lex_buffer", "iter_lex")
 
 TOKENS_FP = "tokens.tok"
+CHUNK_SIZE = 1 << 16
 TOKEN_NAMES = {}
+TOKEN_TAGS = {}
+# Token names by kind id, the kind id of a token is its row in tokens.tok.
+KIND_NAMES = []
+KIND_TAGS = []
+KIND_IDS = {}
 __tokens = None
+__scanners = {}
+# Reserved words lex as their own kind but are still words wherever the grammar expects
+#   a WORD, "label set" is a knob with the value set.
+WORD_KINDS = ("WORD", "TCL_SET", "TCL_PUSH")
+
+LexToken = collections.namedtuple("LexToken", ["name", "value", "tag", "position"])
+# Builds a LexToken from a tuple without going through the keyword handling of LexToken().
+_new_token = tuple.__new__
 
 
 def _read_tokens():
@@ -24,35 +40,269 @@ def _tokens():
     global __tokens
     if not __tokens:
         __tokens = list(_read_tokens())
+        for name, pattern, tag in __tokens:
+            TOKEN_NAMES[name] = pattern
+            TOKEN_TAGS[name] = tag
+            KIND_IDS[name] = len(KIND_NAMES)
+            KIND_NAMES.append(name)
+            KIND_TAGS.append(tag)
     return __tokens
 
 
-def __lex(characters):
+def kind_ids():
+    """
+    :returns: Mapping of token name to its kind id, the ids TokenBuffer.kinds holds.
+    :rtype: dict
+    """
+    _tokens()
+    return KIND_IDS
+
+
+def accepted_kinds(name):
+    """
+    :param name: Token name a grammar terminal is spelled with.
+    :returns: Names of the token kinds the terminal matches.
+    :rtype: tuple[str]
+    """
+    if name == "WORD":
+        return WORD_KINDS
+    return (name,)
+
+
+def terminal_names(kinds):
+    """
+    :param kinds: Token names, like the ones a syntax error expected.
+    :returns: kinds with the reserved words a WORD accepts folded into WORD.
+    :rtype: set[str]
+    """
+    names = set(kinds)
+    if "WORD" in names:
+        names.difference_update(WORD_KINDS[1:])
+    return names
+
+
+def token_names():
+    """
+    :returns: Mapping of token name to the regex pattern from tokens.tok.
+    :rtype: dict
+    """
+    _tokens()
+    return TOKEN_NAMES
+
+
+def _scanners(binary=False):
+    """
+    Compile the token table into master regular expressions.
+
+    Every row of tokens.tok becomes a named group in a single alternation, in file order,
+        so the first row that matches still wins just like it did when every row was
+        tried one after the other.
+    The second scanner is prefixed with a run of every IGNORE pattern and leaves the
+        IGNORE rows out of its alternation, so whitespace is skipped inside the same
+        match call that finds the next real token.
+
+    :param binary: Compile bytes patterns, for scanning bytes and mmap sources.
+    :type binary: bool
+    :returns: (full scanner, skipping scanner, ignore-run scanner)
+    :rtype: tuple
+    """
+    scanners = __scanners.get(binary)
+    if scanners is None:
+        tokens = _tokens()
+        alternation = "|".join(
+            "(?P<%s>%s)" % (name, pattern) for name, pattern, _ in tokens
+        )
+        kept = "|".join(
+            "(?P<%s>%s)" % (name, pattern) for name, pattern, tag in tokens if tag != constants.IGNORE
+        )
+        ignored = "|".join(
+            "(?:%s)" % pattern for _, pattern, tag in tokens if tag == constants.IGNORE
+        ) or "(?!)"
+        patterns = [alternation, "(?:%s)*(?:%s)" % (ignored, kept), "(?:%s)*" % ignored]
+        if binary:
+            patterns = [pattern.encode("ascii") for pattern in patterns]
+        scanners = __scanners[binary] = tuple(re.compile(pattern) for pattern in patterns)
+    return scanners
+
+
+def _illegal(character, pos):
+    if not isinstance(character, str):
+        character = chr(character)
+    return LexerError("Illegal character: %s at pos: %d" % (character, pos))
+
+
+def _scan(characters, pos, end, offset, skip_ignored):
+    """
+    Yield the tokens of characters[pos:end], with positions shifted by offset.
+    """
+    full, skipping, ignore_run = _scanners()
+    scan = (skipping if skip_ignored else full).match
+    tags = TOKEN_TAGS
+    while pos < end:
+        match = scan(characters, pos, end)
+        if not match:
+            if skip_ignored:
+                pos = ignore_run.match(characters, pos, end).end()
+                if pos == end:
+                    break
+            raise _illegal(characters[pos], pos + offset)
+        name = match.lastgroup
+        start = match.start(name)
+        pos = match.end()
+        yield LexToken(name, match.group(name), tags[name], (start + offset, pos + offset))
+
+
+def _last_break(characters):
+    return max(characters.rfind(char) for char in " \t\r\n\f\v")
+
+
+def _iter_lex(fh, skip_ignored, chunk_size):
+    buffer = ""
+    offset = 0
+    eof = False
+    while not eof:
+        data = fh.read(chunk_size)
+        eof = not data
+        buffer += data
+        # Tokens never contain whitespace, so everything up to the last whitespace
+        #   character is safe to scan. The tail may be a token that continues in the
+        #   next chunk and is carried over.
+        limit = len(buffer) if eof else _last_break(buffer) + 1
+        if not limit:
+            continue
+        for token in _scan(buffer, 0, limit, offset, skip_ignored):
+            yield token
+        buffer = buffer[limit:]
+        offset += limit
+
+
+class TokenBuffer(Sequence):
+    """
+    Tokens of a source stored as columns rather than as a LexToken per token.
+
+    The kind id, start and end offset of every token are kept in three parallel arrays
+        over the source, which may be a str, bytes or an mmap. A LexToken, with its
+        text sliced out of the source, is only created when a token is indexed.
+    """
+    __slots__ = ("source", "kinds", "starts", "ends")
+
+    def __init__(self, source, kinds, starts, ends):
+        self.source = source
+        self.kinds = kinds
+        self.starts = starts
+        self.ends = ends
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        kind = self.kinds[index]
+        start = self.starts[index]
+        end = self.ends[index]
+        value = self.source[start:end]
+        if value.__class__ is not str:
+            # Every token pattern only matches ASCII.
+            value = value.decode("ascii")
+        return _new_token(LexToken, (KIND_NAMES[kind], value, KIND_TAGS[kind], (start, end)))
+
+    def __repr__(self):
+        return "<TokenBuffer of %d tokens>" % len(self)
+
+    def name(self, index):
+        """
+        :returns: Token name of the token at index.
+        :rtype: str
+        """
+        return KIND_NAMES[self.kinds[index]]
+
+    def text(self, index):
+        """
+        :returns: Source text of the token at index.
+        :rtype: str
+        """
+        value = self.source[self.starts[index]:self.ends[index]]
+        if value.__class__ is not str:
+            value = value.decode("ascii")
+        return value
+
+
+def lex_buffer(source, skip_ignored=False):
+    """
+    Split nukescript source into a TokenBuffer.
+
+    :param source: Nukescript source, text or ASCII bytes (an mmap for example).
+    :type source: str | bytes | mmap.mmap
+    :param skip_ignored: Drop IGNORE tagged runs (whitespace) without recording them.
+    :type skip_ignored: bool
+    :rtype: TokenBuffer
+    """
+    full, skipping, ignore_run = _scanners(binary=not isinstance(source, str))
+    scanner = skipping if skip_ignored else full
+    scan = scanner.match
+    # Group numbers of the scanner's named groups to their kind ids.
+    ids = kind_ids()
+    group_kinds = [None] * (scanner.groups + 1)
+    for name, group in scanner.groupindex.items():
+        group_kinds[group] = ids[name]
+
+    kinds = array.array("B")
+    starts = array.array("q")
+    ends = array.array("q")
     pos = 0
-    tokens = []
-    lex_token = collections.namedtuple("LexToken", ["name", "value", "tag", "position"])
-    while pos < len(characters):
-        match = None
-        match_name, match_tag = None, None
-        for name, pattern, tag in _tokens():
-            TOKEN_NAMES[name] = pattern
-            regex = re.compile(pattern)
-            match = regex.match(characters, pos)
-            if match:
-                match_name = name
-                match_tag = tag
-                break
+    end = len(source)
+    while pos < end:
+        match = scan(source, pos)
         if not match:
-            _msg = "Illegal character: %s at pos: %d" % (characters[pos], pos)
-            sys.stderr.write(_msg + "\n")
-            raise LexerError(_msg)
-        else:
-            text = match.group(0)
-            token = lex_token(match_name, text, match_tag, (pos, match.end(0)))
-            tokens.append(token)
-            pos = match.end(0)
-    return tokens
-
-
-def lex(characters):
-    return __lex(characters)
+            if skip_ignored:
+                pos = ignore_run.match(source, pos).end()
+                if pos == end:
+                    break
+            raise _illegal(source[pos], pos)
+        group = match.lastindex
+        kinds.append(group_kinds[group])
+        starts.append(match.start(group))
+        pos = match.end()
+        ends.append(pos)
+    return TokenBuffer(source, kinds, starts, ends)
+
+
+def lex(characters, skip_ignored=False):
+    """
+    Split nukescript text into LexTokens.
+
+    :param characters: Nukescript source text.
+    :type characters: str
+    :param skip_ignored: Drop IGNORE tagged runs (whitespace) without creating tokens for them.
+    :type skip_ignored: bool
+    :returns: Tokens in source order.
+    :rtype: list[LexToken]
+    """
+    return list(_scan(characters, 0, len(characters), 0, skip_ignored))
+
+
+def iter_lex(source, skip_ignored=False, chunk_size=CHUNK_SIZE):
+    """
+    Lazily lex a nukescript file, reading it chunk_size characters at a time.
+
+    Only the current chunk and the partial token at its end are held in memory,
+        so memory use does not grow with the size of the script.
+    Token positions are offsets into the whole file, the same as lex would give.
+
+    :param source: Text mode file object or a path to open.
+    :type source: io.TextIOBase | str
+    :param skip_ignored: Drop IGNORE tagged runs (whitespace) without creating tokens for them.
+    :type skip_ignored: bool
+    :param chunk_size: Number of characters to read at a time.
+    :type chunk_size: int
+    :yields: Tokens in source order.
+    :ytype: LexToken
+    """
+    if hasattr(source, "read"):
+        for token in _iter_lex(source, skip_ignored, chunk_size):
+            yield token
+        return
+    with open(source, "r") as fh:
+        for token in _iter_lex(fh, skip_ignored, chunk_size):
+            yield token
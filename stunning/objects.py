@@ -1,57 +1,324 @@
-import collections
+import array
+import bisect
+from collections.abc import Mapping, Sequence
+
+from stunning.exceptions import KeyFrameError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _plain(value):
+    """
+    :returns: value as JSON compatible lists, dicts and scalars.
+    """
+    if isinstance(value, MultiValue):
+        return list(value)
+    if isinstance(value, AnimationCurve):
+        return value.to_dict()
+    return value
 
 
 class ParseObject(object):
-    pass
+    __slots__ = ()
+
+
+class KnobMapping(Mapping):
+    """
+    Read-only view of a node's knob values by knob name.
+
+    It looks values up in the index the node built when it was created, so getting a
+        node's knobs does not build a new dict.
+    """
+    __slots__ = ("_index",)
+
+    def __init__(self, index):
+        self._index = index
+
+    def __getitem__(self, name):
+        return self._index[name].value
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
 
 
 class NodeObject(ParseObject):
+    __slots__ = ("Class", "_knobs", "_index", "tcl_node")
+
     def __init__(self, node_class, tcl_node=None, *knobs):
         super(NodeObject, self).__init__()
         self.Class = node_class
         self._knobs = knobs
+        # Later knobs win when a name repeats, like they do in Nuke.
+        self._index = dict((k.name, k) for k in knobs)
         self.tcl_node = tcl_node
 
+    def __reduce__(self):
+        # The knob index is rebuilt when unpickling rather than stored.
+        return self.__class__, (self.Class, self.tcl_node) + tuple(self._knobs)
+
     @property
     def knobs(self):
-        return dict([(k.name, k.value) for k in self._knobs])
+        """
+        :returns: Knob values by knob name.
+        :rtype: KnobMapping
+        """
+        return KnobMapping(self._index)
+
+    def knob(self, name):
+        """
+        :returns: The KnobObject called name.
+        :rtype: KnobObject
+        :raises KeyError: If the node has no such knob.
+        """
+        return self._index[name]
+
+    def to_dict(self):
+        """
+        :returns: The node as plain, JSON compatible data.
+        :rtype: dict
+        """
+        return {
+            "Class": self.Class,
+            "knobs": dict((name, _plain(knob.value)) for name, knob in self._index.items()),
+            "tcl_node": None if self.tcl_node is None else self.tcl_node.to_dict(),
+        }
 
 
 class KnobObject(ParseObject):
+    __slots__ = ("name", "value")
+
     def __init__(self, name, value):
         super(KnobObject, self).__init__()
         self.name = name
         self.value = value
 
+    def __reduce__(self):
+        return self.__class__, (self.name, self.value)
+
+
+class LazyKnobObject(KnobObject):
+    """
+    KnobObject that only keeps the source span of its value and decodes it the first time
+        value is read.
+
+    Decoded values are the same ones KnobObject holds, except a multi-value is a plain
+        MultiValue on a LazyKnobObject rather than a MultiValueKnobObject.
+    Pickling decodes the value and stores a plain KnobObject.
+    """
+    __slots__ = ("span", "_source", "_value")
+
+    def __init__(self, name, source, span):
+        super(KnobObject, self).__init__()
+        self.name = name
+        self.span = span
+        self._source = source
+        self._value = None
+
+    @property
+    def value(self):
+        if self._source is not None:
+            # The parser imports this module.
+            from stunning.parser import decode_value
+            text = self._source[self.span[0]:self.span[1]]
+            if not isinstance(text, str):
+                # Parsed from bytes or an mmap, every token pattern only matches ASCII.
+                text = text.decode("ascii")
+            self._value = decode_value(text)
+            self._source = None
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        self._source = None
+        self._value = value
+
+    def __reduce__(self):
+        return KnobObject, (self.name, self.value)
+
+
+class MultiValue(Sequence):
+    """
+    Compact, immutable sequence of the values of a multi-value knob.
+
+    Numeric values are stored in a single array("d"), anything else (words, booleans)
+        falls back to a tuple. Either way it is a read-only Sequence that compares
+        equal to a tuple or list with the same values, and gives channel style access:
+        .r .g .b .a for the first four values then .r1 .g1 .b1 .a1 for the next four and
+        so on.
+    """
+    __slots__ = ("_data",)
+    _labels = "rgba"
+
+    def __init__(self, values):
+        if all(type(value) in (int, float) for value in values):
+            self._data = array.array("d", values)
+        else:
+            self._data = tuple(values)
+
+    @property
+    def data(self):
+        """
+        :returns: The backing array("d"), which supports the buffer protocol
+            (numpy.frombuffer for example), or a tuple for non numeric values.
+        """
+        return self._data
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return MultiValue(self._data[index])
+        return self._data[index]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __getattr__(self, label):
+        channel, group = label[:1], label[1:]
+        if channel and channel in self._labels and (not group or group.isdigit()):
+            index = int(group or 0) * len(self._labels) + self._labels.index(channel)
+            if index < len(self):
+                return self._data[index]
+        raise AttributeError("%s has no value %r" % (type(self).__name__, label))
+
+    def __eq__(self, other):
+        if isinstance(other, (MultiValue, tuple, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __hash__(self):
+        return hash(tuple(self._data))
+
+    def __repr__(self):
+        return "MultiValue(%s)" % ", ".join(repr(value) for value in self._data)
+
 
 class MultiValueKnobObject(KnobObject):
-    _labels = ["r", "g", "b", "a"]
+    __slots__ = ()
 
     def __init__(self, name, values):
-        labels = self._labels[:]
-        count = 1
-        while len(labels) < len(values):
-            # Make labels longer than values:
-            #   ["r", "g", "b", "a", "r1", "g1", "b1", "a1"]
-            #   [ 1,   2,   3,   4,   5]
-            labels.extend(
-                ["%s%d" % (label, count) for label in self._labels]
-            )
-            count += 1
-
-        value_names = collections.namedtuple("MultiValueKnob", labels)
-        while len(values) < len(labels):
-            # Pad out our values with None to make them the same length as labels:
-            #   ["r", "g", "b", "a", "r1", "g1", "b1", "a1"]
-            #   [ 1,   2,   3,   4,   5,   None, None, None]
-            values.append(None)
-
-        _values = value_names(*values)
-        super(MultiValueKnobObject, self).__init__(name=name, value=_values)
-        self.values = self.value
+        super(MultiValueKnobObject, self).__init__(name=name, value=MultiValue(values))
+
+    @property
+    def values(self):
+        return self.value
+
+
+class AnimationCurve(object):
+    """
+    Keyframes of an animated knob value.
+
+    Keyframe frames and values are kept sorted in two contiguous array("d")s.
+    Only keyed frames can be evaluated, the interpolation and tangent flags of the curve
+        are not read, so asking for any other frame raises a KeyFrameError.
+        Baked curves are keyed on every frame.
+    """
+    __slots__ = ("frames", "values")
+
+    def __init__(self, frames, values):
+        if any(b <= a for a, b in zip(frames, frames[1:])):
+            keys = dict(zip(frames, values))
+            frames = sorted(keys)
+            values = [keys[frame] for frame in frames]
+        self.frames = array.array("d", frames)
+        self.values = array.array("d", values)
+
+    def __eq__(self, other):
+        if isinstance(other, AnimationCurve):
+            return self.frames == other.frames and self.values == other.values
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "AnimationCurve(%r)" % self.keyframes
+
+    def to_dict(self):
+        """
+        :returns: The keyframes as plain, JSON compatible data.
+        :rtype: dict
+        """
+        return {"frames": list(self.frames), "values": list(self.values)}
+
+    @property
+    def keyframes(self):
+        """
+        :rtype: list[tuple[float, float]]
+        """
+        return list(zip(self.frames, self.values))
+
+    def _index(self, frame):
+        index = bisect.bisect_left(self.frames, frame)
+        if index == len(self.frames) or self.frames[index] != frame:
+            raise KeyFrameError("There is no keyframe at frame %s" % frame)
+        return index
+
+    def valueAt(self, frame):
+        """
+        :param frame: Keyed frame to evaluate.
+        :type frame: int | float
+        :rtype: float
+        :raises KeyFrameError: If frame is not keyed.
+        """
+        return self.values[self._index(frame)]
+
+    def valuesAt(self, frames):
+        """
+        Evaluate many keyed frames at once, a whole frame range for example.
+
+        With NumPy installed this is a single vectorized searchsorted over the keyframes,
+            otherwise every frame is looked up with a binary search.
+
+        :param frames: Keyed frames to evaluate.
+        :type frames: collections.abc.Iterable
+        :returns: One value per frame, a numpy.ndarray when NumPy is installed or an
+            array("d") when it is not.
+        :raises KeyFrameError: If any of the frames is not keyed.
+        """
+        if numpy is None:
+            return array.array("d", [self.values[self._index(frame)] for frame in frames])
+
+        if isinstance(frames, (Sequence, array.array, numpy.ndarray)):
+            frames = numpy.asarray(frames, dtype="d")
+        else:
+            # asarray cannot size a generator up front.
+            frames = numpy.fromiter(frames, "d")
+        keys = numpy.asarray(self.frames)
+        indexes = numpy.searchsorted(keys, frames)
+        found = indexes < len(keys)
+        found[found] = keys[indexes[found]] == frames[found]
+        if not found.all():
+            raise KeyFrameError("There is no keyframe at frame %s" % frames[~found][0])
+        return numpy.asarray(self.values)[indexes]
 
 
 class TCLObject(ParseObject):
+    __slots__ = ("command", "args")
     COMMAND = None
 
     def __init__(self, command, *args):
@@ -59,8 +326,19 @@ class TCLObject(ParseObject):
         self.command = command
         self.args = args
 
+    def __reduce__(self):
+        return self.__class__, (self.command,) + tuple(self.args)
+
+    def to_dict(self):
+        """
+        :returns: The command as plain, JSON compatible data.
+        :rtype: dict
+        """
+        return {"command": self.command, "args": list(self.args)}
+
 
 class SetTCLObject(TCLObject):
+    __slots__ = ("varname", "stackpost")
     COMMAND = "set"
 
     def __init__(self, command, *args):
@@ -71,6 +349,7 @@ class SetTCLObject(TCLObject):
 
 
 class PushTCLObject(TCLObject):
+    __slots__ = ("varname",)
     COMMAND = "push"
 
     def __init__(self, command, *args):
@@ -1,86 +1,502 @@
-import traceback
+import hashlib
+import mmap
+import os
+import re
 
-
-from stunning import lexer
+from stunning import cache, lexer, objects
+from stunning.exceptions import UnexpectedTokenError
 from stunning import constants
-from stunning.exceptions import ParsingError
-from stunning.token import Token
-from stunning.objects import NodeObject, KnobObject, SetTCLObject, PushTCLObject, MultiValueKnobObject
-from stunning.grammar import build_grammar
-
-_PROCESSED = ""
+from stunning.token import Token, TokenCursor, PackratMemo, set_trace, tracing, profiling
+from stunning.objects import (
+    NodeObject, KnobObject, LazyKnobObject, SetTCLObject, PushTCLObject, MultiValue, MultiValueKnobObject,
+    AnimationCurve,
+)
+from stunning.grammar import build_grammar, build_grammar_key, rule_token
+from stunning.codegen import compiled_parser
 
 
 class NodeToken(Token):
-    def resolve(self, tokstream):
-        result = super(NodeToken, self).resolve(tokstream)
-        name_tok = self.result.pop(0)
-        _ = self.result.pop(0)
-        knobs_list = self.result.pop(0)
-        _ = self.result.pop(0)
+    def reduce(self, result, tokstream):
+        name_tok = result.pop(0)
+        _ = result.pop(0)
+        knobs_list = result.pop(0)
+        _ = result.pop(0)
         tcl_node = None
-        if self.result:
-            tcl_code = self._get_tok(self.result.pop(0))
-            tcl_klass = None
-
-            if self._get_tok(tcl_code[0]).value == SetTCLObject.COMMAND:
-                tcl_klass = SetTCLObject
-            elif self._get_tok(tcl_code[0]).value == PushTCLObject.COMMAND:
-                tcl_klass = PushTCLObject
-
-            args = [self._get_tok(arg).value for arg in tcl_code[1:]]
-            tcl_node = tcl_klass(
-                self._get_tok(tcl_code[0]).value,
-                *args
-            )
+        if result:
+            tcl_node = self.tcl_object(self._get_tok(result.pop(0)))
         knobs = self._get_tok(knobs_list)
+        if not isinstance(knobs, list):
+            # A node with a single knob unwraps all the way down to the KnobObject.
+            knobs = [knobs]
         return NodeObject(
             self._get_tok(name_tok).value,
             tcl_node,
             *knobs
         )
 
+    def tcl_object(self, tcl_code):
+        """
+        :param tcl_code: Resolved "tcl_expression" rule.
+        :rtype: TCLObject
+        """
+        tcl_klass = None
+
+        if self._get_tok(tcl_code[0]).value == SetTCLObject.COMMAND:
+            tcl_klass = SetTCLObject
+        elif self._get_tok(tcl_code[0]).value == PushTCLObject.COMMAND:
+            tcl_klass = PushTCLObject
+
+        args = [self._get_tok(arg).value for arg in tcl_code[1:]]
+        return tcl_klass(
+            self._get_tok(tcl_code[0]).value,
+            *args
+        )
+
 
 class KnobToken(Token):
-    def resolve(self, tokstream):
-        result = super(KnobToken, self).resolve(tokstream)
+    def reduce(self, result, tokstream):
         key = self._get_tok(result.pop(0))
         value = self._get_tok(result.pop(0))
+        if tokstream.source is not None:
+            return LazyKnobObject(name=key.value, source=tokstream.source, span=_span(value))
+        if isinstance(value, AnimationCurve):
+            return KnobObject(name=key.value, value=value)
         if isinstance(value, list):
-            values = []
-            for v in value[1]:
-                tok = self._get_tok(v)
-                tok = self._cast(tok)
-                values.append(tok.value)
-            return MultiValueKnobObject(name=key.value, values=values)
+            return MultiValueKnobObject(name=key.value, values=self._values(value))
 
         value = self._cast(value)
         return KnobObject(name=key.value, value=value.value)
 
+    def _values(self, value):
+        values = []
+        for v in value[1]:
+            tok = self._get_tok(v)
+            tok = self._cast(tok)
+            values.append(tok.value)
+        return values
+
+    def decode(self, value):
+        """
+        :param value: Resolved "value" rule.
+        :returns: The value a KnobObject holds for it.
+        """
+        if isinstance(value, AnimationCurve):
+            return value
+        if isinstance(value, list):
+            return MultiValue(self._values(value))
+        return self._cast(value).value
+
+
+class AnimatedValueToken(Token):
+    # Keys are written as an "x<frame>" word, or as an "x" word followed by the frame.
+    FRAME_RE = re.compile(r"x(\d+)$")
+    # Slope and tangent flags, their number lexes apart from them when it is signed, like s-0.5.
+    ARGUMENT_FLAGS = frozenset(["s", "t", "u", "v"])
+
+    def reduce(self, result, tokstream):
+        if tokstream.source is not None:
+            # The knob only keeps the span of the curve, it is built if it is ever read.
+            return result
+        frames = []
+        values = []
+        frame = 1
+        frame_follows = False
+        argument_follows = False
+        for item in result[3]:
+            tok = self._get_tok(item)
+            if tok.name in lexer.WORD_KINDS:
+                match = self.FRAME_RE.match(tok.value)
+                if match:
+                    frame = int(match.group(1))
+                else:
+                    # Interpolation and tangent flags are not evaluated.
+                    frame_follows = tok.value == "x"
+                    argument_follows = tok.value in self.ARGUMENT_FLAGS
+                continue
+            value = self._cast(tok).value
+            if argument_follows:
+                argument_follows = False
+                continue
+            if frame_follows:
+                frame = value
+                frame_follows = False
+                continue
+            frames.append(frame)
+            values.append(value)
+            frame += 1
+        return AnimationCurve(frames, values)
+
 
 Token._TokenClasses["node"] = NodeToken
 Token._TokenClasses["knob"] = KnobToken
+Token._TokenClasses["animated_value"] = AnimatedValueToken
 
 
-def parse(text):
-    tokens = list(filter(lambda t: t.tag != constants.IGNORE, lexer.lex(text)))
+def _span(result):
+    """
+    :returns: (start, end) source position of a resolved value.
+    :rtype: tuple[int, int]
+    """
+    first = last = result
+    while isinstance(first, list):
+        first = first[0]
+    while isinstance(last, list):
+        last = last[-1]
+    if first is last:
+        return first.position
+    return first.position[0], last.position[1]
 
-    grammar = build_grammar()
 
-    main_grammar = grammar["main"][0]
-    results = []
-    for token in main_grammar:
-        result = Token._get_tok(token.resolve(tokens))
-        results.append(result)
-    if len(tokens):
-        for exc_t, exc_o, exc_tb in Token.exc_stack:
-            traceback.print_exception(exc_t, exc_o, exc_tb)
-        raise ParsingError(
-            "The stunning library was unable to consume the entire text passed to it.\n"
-            "This is probably due to a syntax error in the text.\n"
-            "Resulting token stream contained %s..." % tokens[:3]
-        )
-    return Token._get_tok(results)
+# Kinds of a single_value, the only tokens inside a multi_value.
+_SINGLE_KINDS = frozenset(lexer.WORD_KINDS + ("FLOAT", "INT"))
+
+
+def decode_value(text, compiled=True):
+    """
+    Decode the source text of a single knob value the way parse would have.
+
+    LazyKnobObject uses this to decode its value the first time it is read.
+
+    :param text: Source of one knob value, like 66.6, {1 0.5 0.5 1} or {{curve x1 0}}.
+    :type text: str
+    :param compiled: Resolve curves with the parser generated by stunning.codegen.
+    :type compiled: bool
+    :returns: The value a KnobObject holds for it.
+    :raises UnexpectedTokenError: If text is not a knob value.
+    """
+    return _decode_tokens(lexer.lex(text, skip_ignored=True), text, compiled)
+
+
+def _decode_tokens(tokens, text, compiled=True):
+    knob = Token._TokenClasses["knob"]("knob", None)
+    if len(tokens) == 1 and tokens[0].name in _SINGLE_KINDS:
+        return knob.decode(tokens[0])
+    if (
+        len(tokens) > 2 and tokens[0].name == "OPEN_BRACE" and tokens[-1].name == "CLOSE_BRACE"
+        and all(token.name in _SINGLE_KINDS for token in tokens[1:-1])
+    ):
+        # A multi_value is flat, its values are cast without resolving the grammar.
+        return MultiValue([knob._cast(token).value for token in tokens[1:-1]])
+    cursor = TokenCursor(tuple(tokens))
+    value = _resolver("value", compiled)(cursor)
+    if value is None or len(cursor):
+        raise _syntax_error(text, cursor)
+    return knob.decode(Token._get_tok(value))
+
+
+_BRACES_RE = re.compile(r"[{}]")
+_CLASS_RE = re.compile(r"\w*")
+
+# Parse cache key prefix for this process, keyed by grammar_key.
+_CACHE_SALTS = {}
+
+# Rule tokens built by _resolver, keyed by (grammar_key, rule name).
+_RULES = {}
+
+
+def _resolver(rule, compiled=True):
+    """
+    :returns: Function resolving the grammar rule called rule from a TokenCursor.
+    """
+    if compiled and not tracing() and not profiling():
+        return compiled_parser(rule)
+    key = (build_grammar_key(), rule)
+    token = _RULES.get(key)
+    if token is None:
+        token = _RULES[key] = rule_token(rule)
+    return token.resolve
+
+
+def _node_groups(tokens):
+    """
+    Split a token stream into the tokens of each top-level node, set/push trailer included.
+
+    A node starts at a WORD followed by an OPEN_BRACE outside of any braces, so only the
+        brace depth is tracked, none of the grammar is resolved.
+
+    :type tokens: collections.abc.Iterable[LexToken]
+    :yields: The tokens of one node.
+    :ytype: list[LexToken]
+    """
+    group = []
+    depth = 0
+    for token in tokens:
+        kind = token.name
+        if kind == "OPEN_BRACE":
+            if not depth and len(group) > 1 and group[-1].name == "WORD":
+                start = group.pop()
+                yield group
+                group = [start]
+            depth += 1
+        elif kind == "CLOSE_BRACE":
+            depth -= 1
+        group.append(token)
+    if group:
+        yield group
+
+
+def _node_starts(text):
+    """
+    Find where every top-level node of text starts, without lexing it.
+
+    Like _node_groups, a node starts at the word in front of an opening brace outside of
+        any braces. Nukescript has no quoted strings, so counting braces is enough.
+
+    :type text: str
+    :yields: Offset of the first character of each node's class name.
+    :ytype: int
+    """
+    depth = 0
+    for match in _BRACES_RE.finditer(text):
+        if match.group() == "}":
+            depth -= 1
+            continue
+        if not depth:
+            start = match.start()
+            while start and text[start - 1].isspace():
+                start -= 1
+            while start and (text[start - 1].isalnum() or text[start - 1] == "_"):
+                start -= 1
+            yield start
+        depth += 1
+
+
+def _parse_node(tokens, text=None, compiled=True, source=None):
+    cursor = TokenCursor(tuple(tokens), source=source)
+    node = _resolver("node", compiled)(cursor)
+    if node is None or len(cursor):
+        raise _syntax_error(text, cursor)
+    return node
+
+
+def iter_nodes(source, compiled=True):
+    """
+    Parse a nukescript file one node at a time.
+
+    The file is lexed with lexer.iter_lex and every node is parsed as soon as the next
+        one starts, so memory use stays proportional to a single node rather than to
+        the whole script.
+
+    :param source: Text mode file object or a path to open.
+    :type source: io.TextIOBase | str
+    :param compiled: Use the parser generated from the grammar by stunning.codegen.
+    :type compiled: bool
+    :yields: The same NodeObjects parse returns, each with its set/push tcl_node.
+    :ytype: NodeObject
+    :raises UnexpectedTokenError: If a node does not match the grammar. The text is not
+        kept, so the error only knows the offset of the failing token.
+    """
+    for group in _node_groups(lexer.iter_lex(source, skip_ignored=True)):
+        yield _parse_node(group, compiled=compiled)
+
+
+def _value_end(tokens, index):
+    """
+    :returns: Index just past the knob value starting at tokens[index], None if no value
+        starts there.
+    """
+    if index >= len(tokens) or tokens[index].name == "CLOSE_BRACE":
+        return None
+    if tokens[index].name != "OPEN_BRACE":
+        return index + 1
+    depth = 0
+    for end in range(index, len(tokens)):
+        kind = tokens[end].name
+        if kind == "OPEN_BRACE":
+            depth += 1
+        elif kind == "CLOSE_BRACE":
+            depth -= 1
+            if not depth:
+                return end + 1
+    return None
+
+
+def _project_node(text, start, end, knobs, compiled):
+    """
+    Parse the node in text[start:end] keeping only the knobs called one of knobs.
+
+    Knobs are told apart with a brace-matching scan over the node's tokens and only the
+        values of the kept knobs are decoded. Anything the scan does not expect is
+        handed to the grammar's node rule, which raises the syntax error.
+    Without knobs every knob is kept, so the node rule resolves the whole node.
+    """
+    tokens = tuple(lexer._scan(text, start, end, 0, True))
+    if knobs is None:
+        return _parse_node(tokens, text, compiled)
+    kept = []
+    index = 2
+    while index < len(tokens) and tokens[index].name in lexer.WORD_KINDS:
+        value_end = _value_end(tokens, index + 1)
+        if value_end is None:
+            break
+        if tokens[index].value in knobs:
+            kept.append(KnobObject(tokens[index].value, _decode_tokens(tokens[index + 1:value_end], text, compiled)))
+        index = value_end
+
+    if (
+        index < 3 or tokens[0].name != "WORD" or tokens[1].name != "OPEN_BRACE"
+        or index >= len(tokens) or tokens[index].name != "CLOSE_BRACE"
+    ):
+        node = _parse_node(tokens, text, compiled)
+        kept = [knob for knob in node._knobs if knob.name in knobs]
+        return NodeObject(node.Class, node.tcl_node, *kept)
+
+    tcl_node = None
+    if index + 1 < len(tokens):
+        cursor = TokenCursor(tokens[index + 1:])
+        tcl_code = _resolver("tcl_expression", compiled)(cursor)
+        if tcl_code is None or len(cursor):
+            raise _syntax_error(text, cursor)
+        tcl_node = Token._TokenClasses["node"]("node", None).tcl_object(Token._get_tok(tcl_code))
+    return NodeObject(tokens[0].value, tcl_node, *kept)
+
+
+def _project(text, classes, knobs, compiled):
+    starts = list(_node_starts(text))
+    if not starts:
+        # Not a single node, the grammar reports why.
+        return parse(text, compiled=compiled)
+    ends = starts[1:] + [len(text)]
+    nodes = []
+    for position, (start, end) in enumerate(zip(starts, ends)):
+        if classes is not None and _CLASS_RE.match(text, start).group() not in classes:
+            continue
+        # Whatever comes before the first node is part of it, so it is still checked.
+        nodes.append(_project_node(text, start if position else 0, end, knobs, compiled))
+    return nodes
+
+
+def _interpret(tokens):
+    main_grammar = build_grammar()["main"][0]
+    return [token.resolve(tokens) for token in main_grammar]
+
+
+def _parse_cache_name(text):
+    """
+    :returns: Name of the parse cache entry for text, which changes with the grammar
+        and with the object classes the result is pickled as.
+    """
+    key = build_grammar_key()
+    salt = _CACHE_SALTS.get(key)
+    if salt is None:
+        digest = hashlib.sha256(key.encode("utf-8"))
+        with open(objects.__file__, "rb") as fh:
+            digest.update(fh.read())
+        salt = _CACHE_SALTS[key] = digest.digest()
+    digest = hashlib.sha256(salt)
+    digest.update(text.encode("utf-8") if isinstance(text, str) else text)
+    return os.path.join("parses", digest.hexdigest() + ".pickle")
+
+
+def _parse_cache_size():
+    return int(os.environ.get(constants.PARSE_CACHE_SIZE_ENV_KEY) or constants.PARSE_CACHE_SIZE)
+
+
+def parse(text, packrat=False, compiled=True, lazy=False, classes=None, knobs=None, cached=False):
+    """
+    Parse nukescript text into a list of NodeObjects.
+
+    :param text: Nukescript source text, or its ASCII bytes (see parse_file), which
+        cannot be combined with classes or knobs.
+    :type text: str | bytes | mmap.mmap
+    :param packrat: Cache rule results by token position so alternatives sharing a
+        prefix (like the two node rules) do not parse it again.
+        Packrat parsing always interprets the grammar, as does parsing while a trace hook
+        is installed with stunning.token.set_trace or a stunning.profiling.Profile is active.
+    :type packrat: bool
+    :param compiled: Use the parser generated from the grammar by stunning.codegen
+        instead of interpreting the grammar tree.
+    :type compiled: bool
+    :param lazy: Create LazyKnobObjects, which keep the source span of their value and
+        only decode it the first time it is read. Only the knobs that are read pay for
+        casting their value.
+    :type lazy: bool
+    :param classes: Only parse the nodes of these classes. The other nodes are skipped
+        with a scan for their closing brace and are not checked against the grammar.
+    :type classes: collections.abc.Container[str]
+    :param knobs: Only keep the knobs with these names. The values of the other knobs
+        are skipped over without being decoded.
+    :type knobs: collections.abc.Container[str]
+    :param cached: Look the text up in the on-disk parse cache (see stunning.cache)
+        before parsing it, and store the result there after. A hit is loaded without
+        lexing or parsing anything. The cache is keyed by the text and the grammar,
+        it ignores lazy and is not used with classes or knobs.
+    :type cached: bool
+    :rtype: list[NodeObject]
+    :raises UnexpectedTokenError: If the text does not match the grammar.
+    :raises TypeError: If text is not a str and classes or knobs are given.
+    """
+    if classes is not None or knobs is not None:
+        if not isinstance(text, str):
+            raise TypeError("classes and knobs can only be used to parse str text, not %s" % type(text).__name__)
+        return _project(text, classes, knobs, compiled)
+    if cached:
+        name = _parse_cache_name(text)
+        nodes = cache.load(name, touch=True)
+        if nodes is None:
+            nodes = parse(text, packrat=packrat, compiled=compiled)
+            cache.dump(name, nodes, max_size=_parse_cache_size())
+        return nodes
+
+    memo = PackratMemo(constants.PACKRAT_MEMO_SIZE) if packrat else None
+    tokens = TokenCursor(
+        lexer.lex_buffer(text, skip_ignored=True),
+        memo=memo,
+        source=text if lazy else None,
+    )
+
+    if compiled and not packrat and not tracing() and not profiling():
+        results = compiled_parser()(tokens)
+    else:
+        results = _interpret(tokens)
+    if len(tokens) or None in results:
+        raise _syntax_error(text, tokens)
+    nodes = Token._get_tok([Token._get_tok(result) for result in results])
+    if not isinstance(nodes, list):
+        # A script with a single node unwraps all the way down to the NodeObject.
+        nodes = [nodes]
+    return nodes
+
+
+def parse_file(path, packrat=False, compiled=True, lazy=False, cached=False):
+    """
+    Parse a nukescript file without reading it into a str first.
+
+    The file is memory-mapped and lexed as bytes, so it is never copied into the
+        process, and only the text of the tokens the result holds on to is decoded.
+        Processes parsing the same file share its pages in the page cache.
+
+    :param path: Path of the nukescript file.
+    :type path: str
+    :param lazy: See parse. The file stays mapped for as long as the lazy knobs
+        refer to it. It has no effect together with cached.
+    :type lazy: bool
+    :returns: The same NodeObjects parse returns for the text of the file.
+    :rtype: list[NodeObject]
+    :raises UnexpectedTokenError: If the file does not match the grammar.
+    """
+    with open(path, "rb") as fh:
+        if not os.fstat(fh.fileno()).st_size:
+            # Empty files cannot be mapped.
+            return parse("", packrat=packrat, compiled=compiled)
+        source = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return parse(source, packrat=packrat, compiled=compiled, lazy=lazy, cached=cached)
+    finally:
+        # A cache hit, like a miss, holds eager knobs that do not refer to the map.
+        if not lazy or cached:
+            source.close()
+
+
+def _syntax_error(text, tokens):
+    if text is not None and not isinstance(text, str):
+        # The error works out lines and columns on text, which may be closed by the time
+        #   it is read when it is an mmap.
+        text = text[:].decode("ascii", "replace")
+    index = max(tokens.furthest, tokens.index)
+    expected = lexer.terminal_names(tokens.expected) if index == tokens.furthest else ()
+    token = tokens.tokens[index] if index < len(tokens.tokens) else None
+    return UnexpectedTokenError(text, token, expected)
 
 
 if __name__ == "__main__":
@@ -106,12 +522,14 @@ Grade {
  xpos -150
  ypos -513
 }"""
+    processed = []
+    set_trace(lambda event, payload: event == "consume" and processed.append(payload.value))
     try:
         parse(t)
     finally:
         print("")
         print("")
-        print("Processed the following text: %s" %_PROCESSED)
+        print("Processed the following text: %s" % " ".join(processed))
         print("")
         print("")
 
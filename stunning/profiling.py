@@ -0,0 +1,195 @@
+"""
+Per rule profiling of the grammar interpreter.
+
+Use a Profile as a context manager around parsing to find the rules of a grammar, most
+    likely a STUNNING_BNF_GRAMMAR_FILES plugin, that are hot or backtrack a lot:
+
+    with Profile() as profile:
+        parser.parse(text)
+    print(profile.report())
+    profile.write_folded("parse.folded")
+
+While a Profile is active parse interprets the grammar, the generated parser does not
+    go through Token.resolve. The folded stacks work with flamegraph.pl and speedscope.
+
+Or from a shell:
+    python -m stunning.profiling [--sort seconds] [--folded parse.folded] script.nk
+"""
+import argparse
+import collections
+import sys
+import time
+
+from stunning.token import set_profile
+
+
+class RuleStats(object):
+    """
+    Counters of a single grammar rule.
+
+    attempts: Times the rule was resolved, packrat memo hits are not counted.
+    successes: Times it resolved.
+    backtracks: Options of the rule that failed and were rewound.
+    consumed: Tokens consumed by its successful attempts, nested rules included.
+    rewound: Tokens given back by its backtracks.
+    seconds: Time spent resolving it, nested rules included. Recursive calls are
+        only counted once.
+    own_seconds: Time spent resolving it, nested rules excluded.
+    """
+    __slots__ = ("name", "attempts", "successes", "backtracks", "consumed", "rewound", "seconds", "own_seconds")
+
+    def __init__(self, name):
+        super(RuleStats, self).__init__()
+        self.name = name
+        self.attempts = 0
+        self.successes = 0
+        self.backtracks = 0
+        self.consumed = 0
+        self.rewound = 0
+        self.seconds = 0.0
+        self.own_seconds = 0.0
+
+    def __repr__(self):
+        return "<RuleStats(%s) %d attempts, %d backtracks, %.6fs>" % (
+            self.name, self.attempts, self.backtracks, self.seconds
+        )
+
+
+class Profile(object):
+    """
+    Profile collects RuleStats for every grammar rule the interpreter resolves, and the
+        time spent in every stack of nested rules.
+    """
+    COLUMNS = ("attempts", "successes", "backtracks", "consumed", "rewound", "seconds", "own_seconds")
+
+    def __init__(self, clock=time.perf_counter):
+        super(Profile, self).__init__()
+        self.clock = clock
+        self.rules = {}
+        # Own time by stack of rule names, outermost first.
+        self.stacks = collections.Counter()
+        self._stack = []
+        self._child_seconds = []
+        self._active = collections.Counter()
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = set_profile(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        set_profile(self._previous)
+        self._previous = None
+
+    def _stats(self, name):
+        stats = self.rules.get(name)
+        if stats is None:
+            stats = self.rules[name] = RuleStats(name)
+        return stats
+
+    def resolve(self, token, tokstream):
+        """
+        Resolve the rule token from tokstream, recording it. Called by Token.resolve.
+
+        :returns: The result of token.
+        """
+        name = token.name
+        stats = self._stats(name)
+        stats.attempts += 1
+        start = tokstream.index
+        self._stack.append(name)
+        self._child_seconds.append(0.0)
+        self._active[name] += 1
+        started = self.clock()
+        try:
+            result = token._resolve_options(tokstream)
+        finally:
+            elapsed = self.clock() - started
+            own = elapsed - self._child_seconds.pop()
+            self.stacks[tuple(self._stack)] += own
+            self._stack.pop()
+            self._active[name] -= 1
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+            if not self._active[name]:
+                stats.seconds += elapsed
+            stats.own_seconds += own
+        if result is not None:
+            stats.successes += 1
+            stats.consumed += tokstream.index - start
+        return result
+
+    def backtrack(self, token, rewound):
+        """
+        Record a failed option that gave back rewound tokens. It is counted against the
+            innermost rule being resolved, or token itself outside of any rule.
+        """
+        stats = self._stats(self._stack[-1] if self._stack else token.name)
+        stats.backtracks += 1
+        stats.rewound += rewound
+
+    def report(self, sort="seconds", limit=None):
+        """
+        :param sort: RuleStats attribute to sort by, highest first.
+        :type sort: str
+        :param limit: Only report this many rules.
+        :type limit: int
+        :returns: A table of the RuleStats of every rule.
+        :rtype: str
+        """
+        if sort not in self.COLUMNS:
+            raise ValueError("Cannot sort by %r, expected one of %s" % (sort, ", ".join(self.COLUMNS)))
+        rules = sorted(self.rules.values(), key=lambda stats: getattr(stats, sort), reverse=True)[:limit]
+        width = max([len("rule")] + [len(stats.name) for stats in rules])
+        lines = ["%-*s %s" % (width, "rule", " ".join("%12s" % column for column in self.COLUMNS))]
+        for stats in rules:
+            values = []
+            for column in self.COLUMNS:
+                value = getattr(stats, column)
+                values.append("%12.6f" % value if isinstance(value, float) else "%12d" % value)
+            lines.append("%-*s %s" % (width, stats.name, " ".join(values)))
+        return "\n".join(lines)
+
+    def folded(self):
+        """
+        :returns: Lines of semicolon separated rule stacks and their own time in
+            microseconds, the folded format flame graph tools read.
+        :rtype: list[str]
+        """
+        return [
+            "%s %d" % (";".join(stack), round(seconds * 1e6))
+            for stack, seconds in sorted(self.stacks.items())
+        ]
+
+    def write_folded(self, path):
+        """
+        Write folded to path.
+
+        :type path: str
+        """
+        with open(path, "w") as fh:
+            for line in self.folded():
+                fh.write(line + "\n")
+
+
+def main(argv=None):
+    from stunning import parser
+
+    arguments = argparse.ArgumentParser(prog="python -m stunning.profiling", description="Profile parsing nukescripts by grammar rule.")
+    arguments.add_argument("paths", nargs="+", help="Nukescript files to parse.")
+    arguments.add_argument("--sort", default="seconds", choices=Profile.COLUMNS, help="Column to sort the report by.")
+    arguments.add_argument("--limit", type=int, help="Only report this many rules.")
+    arguments.add_argument("--folded", help="Write the folded rule stacks to this file.")
+    args = arguments.parse_args(argv)
+
+    with Profile() as profile:
+        for path in args.paths:
+            parser.parse_file(path)
+    print(profile.report(sort=args.sort, limit=args.limit))
+    if args.folded:
+        profile.write_folded(args.folded)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Script is the list of nodes parse returns with indexes for looking nodes up.
+
+The indexes are built on the first lookup, in a single pass over the nodes, and map a
+    node Class, a "name" or a knob name to the positions of the matching nodes. Queries
+    intersect those position sets and only test knob values on the nodes left over.
+"""
+import fnmatch
+from collections.abc import Sequence
+
+# Characters that make a string query a glob pattern rather than a plain value.
+_GLOB_CHARACTERS = frozenset("*?[")
+
+
+def _matcher(query):
+    """
+    :returns: Predicate for a knob value query: a glob pattern string, a compiled regular
+        expression, a callable or a plain value to compare with.
+    """
+    if isinstance(query, str):
+        return lambda value: isinstance(value, str) and fnmatch.fnmatchcase(value, query)
+    if hasattr(query, "search"):
+        return lambda value: isinstance(value, str) and query.search(value) is not None
+    if callable(query):
+        return query
+    return lambda value: value == query
+
+
+class Script(Sequence):
+    """
+    Read-only sequence of the nodes of a script, in script order, with lookups by Class,
+        name and knob that do not scan every node.
+    """
+
+    def __init__(self, nodes):
+        """
+        :param nodes: Nodes in script order, as parse returns them.
+        :type nodes: list[NodeObject]
+        """
+        super(Script, self).__init__()
+        self.nodes = list(nodes)
+        self._classes = None
+        self._names = None
+        self._knobs = None
+        # Knob name -> {value: positions}, built per knob the first time it is compared.
+        self._values = {}
+
+    def __getitem__(self, index):
+        return self.nodes[index]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __repr__(self):
+        return "<Script of %d nodes>" % len(self.nodes)
+
+    def _index(self):
+        if self._classes is not None:
+            return
+        classes = {}
+        names = {}
+        knobs = {}
+        for position, node in enumerate(self.nodes):
+            classes.setdefault(node.Class, []).append(position)
+            for knob_name in node.knobs:
+                knobs.setdefault(knob_name, []).append(position)
+            name = node.knobs.get("name")
+            if name is not None:
+                names[name] = position
+        self._classes = classes
+        self._names = names
+        self._knobs = knobs
+
+    def _value_index(self, knob_name):
+        index = self._values.get(knob_name)
+        if index is None:
+            self._index()
+            index = self._values[knob_name] = {}
+            for position in self._knobs.get(knob_name, ()):
+                value = self.nodes[position].knobs[knob_name]
+                try:
+                    index.setdefault(value, []).append(position)
+                except TypeError:
+                    # Unhashable values (curves) are never equal to a plain value query.
+                    continue
+        return index
+
+    @property
+    def classes(self):
+        """
+        :returns: Node Class names in the script.
+        :rtype: collections.abc.KeysView
+        """
+        self._index()
+        return self._classes.keys()
+
+    def node(self, name):
+        """
+        :param name: Value of the node's "name" knob.
+        :type name: str
+        :rtype: NodeObject
+        :raises KeyError: If no node has that name.
+        """
+        self._index()
+        return self.nodes[self._names[name]]
+
+    def of_class(self, node_class):
+        """
+        :returns: Nodes of node_class, in script order.
+        :rtype: list[NodeObject]
+        """
+        self._index()
+        return [self.nodes[p] for p in self._classes.get(node_class, ())]
+
+    def with_knob(self, knob_name):
+        """
+        :returns: Nodes that have a knob called knob_name, in script order.
+        :rtype: list[NodeObject]
+        """
+        self._index()
+        return [self.nodes[p] for p in self._knobs.get(knob_name, ())]
+
+    def find(self, Class=None, name=None, knobs=None):
+        """
+        Find the nodes matching every one of the given conditions.
+
+        Knob conditions map a knob name to one of:
+            None to only require the knob,
+            a string, matched as a glob pattern like "*.exr" on string values,
+            a compiled regular expression, searched for in string values,
+            a callable taking the value and returning whether it matches,
+            or any other value, which the knob value has to equal.
+
+        :param Class: Node Class, or a collection of them.
+        :type Class: str | collections.abc.Iterable[str]
+        :param name: Value of the node's "name" knob.
+        :type name: str
+        :param knobs: Knob conditions by knob name.
+        :type knobs: dict
+        :returns: Matching nodes, in script order.
+        :rtype: list[NodeObject]
+        """
+        self._index()
+        candidates = []
+        if Class is not None:
+            classes = [Class] if isinstance(Class, str) else Class
+            candidates.append(set(p for c in classes for p in self._classes.get(c, ())))
+        if name is not None:
+            candidates.append({self._names[name]} if name in self._names else set())
+
+        tests = []
+        for knob_name, query in (knobs or {}).items():
+            if query is None or (isinstance(query, str) and _GLOB_CHARACTERS.isdisjoint(query)):
+                if query is None:
+                    positions = self._knobs.get(knob_name, ())
+                else:
+                    positions = self._value_index(knob_name).get(query, ())
+                candidates.append(set(positions))
+            else:
+                candidates.append(set(self._knobs.get(knob_name, ())))
+                tests.append((knob_name, _matcher(query)))
+
+        if candidates:
+            # Intersect starting from the smallest set, which is also all that is left to test.
+            candidates.sort(key=len)
+            positions = candidates[0].intersection(*candidates[1:])
+        else:
+            positions = range(len(self.nodes))
+        return [
+            self.nodes[p] for p in sorted(positions)
+            if all(test(self.nodes[p].knobs[knob_name]) for knob_name, test in tests)
+        ]
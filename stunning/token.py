@@ -1,10 +1,191 @@
+import array
+import collections
 import contextlib
-import re
+import logging
 import sys
 
-from stunning.exceptions import ParsingError, ResolvingError
+from stunning import lexer
 
-_PROCESSED = ""
+
+# Opt-in tracing hook, see set_trace.
+_TRACE = None
+# Opt-in per rule profile, see set_profile.
+_PROFILE = None
+
+
+def set_trace(hook):
+    """
+    Install a hook that is told about every step the grammar interpreter takes.
+
+    The hook is called as hook(event, payload):
+        "consume" with the LexToken that was just consumed.
+        "backtrack" with the Token whose option failed and was rewound.
+        "error" with an exception raised while resolving, which is treated as a failure.
+    While a hook is installed Token.exc_stack also collects the exc_info of every
+        failed attempt since the last option was started.
+    Tracing is off by default and costs nothing but a None check when it is off.
+
+    :param hook: Callable or None to turn tracing off.
+    :returns: The previously installed hook.
+    """
+    global _TRACE
+    previous, _TRACE = _TRACE, hook
+    return previous
+
+
+def tracing():
+    """
+    :returns: Whether a trace hook is installed.
+    :rtype: bool
+    """
+    return _TRACE is not None
+
+
+def set_profile(profile):
+    """
+    Install a profile that Token.resolve reports every grammar rule it resolves to.
+
+    Like tracing it is off by default and costs nothing but a None check when it is off.
+    stunning.profiling.Profile installs itself when used as a context manager.
+
+    :param profile: stunning.profiling.Profile or None to turn profiling off.
+    :returns: The previously installed profile.
+    """
+    global _PROFILE
+    previous, _PROFILE = _PROFILE, profile
+    return previous
+
+
+def profiling():
+    """
+    :returns: Whether a profile is installed.
+    :rtype: bool
+    """
+    return _PROFILE is not None
+
+
+def log_trace(event, payload):
+    """
+    Trace hook that writes every event to the "stunning" logger at DEBUG level.
+    """
+    logging.getLogger("stunning").debug("%s %r", event, payload)
+
+
+class PackratMemo(object):
+    """
+    PackratMemo caches the outcome of resolving a grammar rule at a token position.
+
+    Entries are keyed by (rule name, cursor index) and hold the result and the index
+        the rule finished at, or a failure marker.
+    The table is bounded, the least recently used entries are evicted first. The parser
+        only moves forward, so those are the positions it is done with.
+    """
+    FAILED = object()
+
+    def __init__(self, maxsize):
+        super(PackratMemo, self).__init__()
+        self.maxsize = maxsize
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, result, end):
+        self._entries[key] = (result, end)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class TokenCursor(object):
+    """
+    TokenCursor is a read position over an immutable sequence of tokens.
+
+    Consuming a token only moves the index forward and backtracking only restores
+        a previous index, so the token sequence itself is never copied or modified.
+    """
+    __slots__ = ("tokens", "kinds", "index", "memo", "furthest", "expected", "source")
+
+    def __init__(self, tokens, index=0, memo=None, source=None):
+        super(TokenCursor, self).__init__()
+        self.tokens = tokens
+        # Kind id of every token (see lexer.kind_ids), a TokenBuffer already has them.
+        self.kinds = getattr(tokens, "kinds", None)
+        if self.kinds is None:
+            ids = lexer.kind_ids()
+            self.kinds = array.array("B", [ids[token.name] for token in tokens])
+        self.index = index
+        self.memo = memo
+        # Text the tokens were lexed from, only set when knob values are decoded lazily.
+        self.source = source
+        # Furthest index a token was rejected at and what would have been accepted there.
+        self.furthest = index
+        self.expected = set()
+
+    def __len__(self):
+        return len(self.tokens) - self.index
+
+    def __repr__(self):
+        return "<TokenCursor at %d of %d: %s...>" % (self.index, len(self.tokens), self.lookahead(3))
+
+    def peek(self):
+        """
+        :returns: The next token without consuming it.
+        :raises IndexError: If every token has been consumed.
+        """
+        return self.tokens[self.index]
+
+    def peek_kind(self):
+        """
+        :returns: The kind of the next token, or None if every token has been consumed.
+        """
+        if self.index < len(self.kinds):
+            return lexer.KIND_NAMES[self.kinds[self.index]]
+        return None
+
+    def expect(self, expected):
+        """
+        Record that the next token was rejected because expected was wanted instead.
+
+        Only the furthest index anything was rejected at is kept, that is where a syntax
+            error is reported.
+        """
+        index = self.index
+        if index >= self.furthest:
+            if index > self.furthest:
+                self.furthest = index
+                self.expected = set()
+            self.expected.add(expected)
+
+    def expect_any(self, expected):
+        index = self.index
+        if index >= self.furthest:
+            if index > self.furthest:
+                self.furthest = index
+                self.expected = set()
+            self.expected.update(expected)
+
+    def advance(self):
+        """
+        :returns: The next token, consuming it.
+        :raises IndexError: If every token has been consumed.
+        """
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def lookahead(self, count):
+        return list(self.tokens[self.index:self.index + count])
 
 
 class Token(object):
@@ -19,6 +200,11 @@ class Token(object):
         self.name = name
         self.values = values
         self.greedy = False
+        # Set by the grammar builder on tokens that name a grammar rule.
+        self.is_rule = False
+        # Set by the grammar builder on rule and Or tokens, maps the kind of the next
+        #   LexToken to the indexes of the options whose FIRST set contains it.
+        self.predict = None
 
     @classmethod
     def _get_tok(cls, obj):
@@ -69,23 +255,66 @@ class Token(object):
         elif isinstance(value, Token):
             return self._resolve_token(tokstream, value)
         else:
-            return self._resolve_regex(tokstream, value)
+            return self._resolve_terminal(tokstream, value)
+
+    def _options(self, tokstream):
+        if self.predict is None:
+            return self.values
+        indexes = self.predict.get(tokstream.peek_kind())
+        if indexes is None:
+            tokstream.expect_any(self.predict)
+            return ()
+        return [self.values[index] for index in indexes]
 
     def resolve(self, tokstream):
-        for each_option in self.values:
-            Token.exc_stack.clear()
+        """
+        Resolve the first option of this token that matches the tokens at the cursor.
+
+        A failure is not raised, it is recorded on the cursor (see TokenCursor.expect)
+            and None is returned with the cursor back where it started.
 
+        :param tokstream: Cursor over the tokens being parsed.
+        :type tokstream: TokenCursor
+        :returns: The reduced result, or None if no option resolves.
+        """
+        if _PROFILE is not None and self.is_rule:
+            return _PROFILE.resolve(self, tokstream)
+        return self._resolve_options(tokstream)
+
+    def _resolve_options(self, tokstream):
+        for each_option in self._options(tokstream):
+            if _TRACE is not None:
+                Token.exc_stack.clear()
+
+            start = tokstream.index
             with self.rewindable(tokstream) as rewound:
                 result = self._resolve(tokstream, each_option)
                 if result:
-                    self.result = result
-                    return result
+                    return self.reduce(result, tokstream)
             if rewound:
                 continue
-        raise ResolvingError(
-            "Could not resolve %s token.\nToken stream contained: %s"
-            % (self.name, tokstream)
-        )
+            if _PROFILE is not None:
+                _PROFILE.backtrack(self, tokstream.index - start)
+            # The option came back empty, undo what it consumed.
+            tokstream.index = start
+            if _TRACE is not None:
+                _TRACE("backtrack", self)
+        return None
+
+    def reduce(self, result, tokstream):
+        """
+        Turn the raw result of a successfully resolved option into this token's value.
+
+        Subclasses registered in Token._TokenClasses override this to build ParseObjects.
+        The generated parser (see stunning.codegen) calls the same method, so both
+            engines produce the same objects.
+
+        :param result: Nested lists of the option's resolved parts.
+        :type result: list
+        :param tokstream: Cursor the result was resolved from.
+        :type tokstream: TokenCursor
+        """
+        return result
 
     def _resolve_list(self, tokstream, list_value):
         values = []
@@ -101,70 +330,113 @@ class Token(object):
         """
         rewindable is a helpful contextmanager that will attempt to execute it's body and
             on exception will rewind the tokenstream back to it's previous state.
-        It does this by reverse inserting back into the container.
-        This preserves references to mutable structures but sill allows us to undo
-            tokstream consuming actions.
+        It does this by restoring the cursor index, the tokens themselves are never touched.
+        Resolving reports failures by returning None, so this only catches errors raised
+            by Token.reduce overrides.
 
-        rewindable will also insert exceptions into the exc_stack on the Token class obj.
+        While tracing (see set_trace) rewindable will also insert exceptions into the
+            exc_stack on the Token class obj and report them to the trace hook.
         This can be used at the end of parsing to see the chain of events that caused an
             incorrect parsing.
 
-        :param stream: Mutable iterable container of tokens.
-        :type stream: types.Iterable
+        :param stream: Cursor over the tokens being parsed.
+        :type stream: TokenCursor
         :yields: A mutable sentinel value that you can test the "truthy-ness" of to detect
             if the previous operation failed. If the sentinel is "truthy", it will contain
             one or more exception tuples in it that you are able to do what you want with.
         :ytype: types.Iterable
         """
-        backup = stream[:]
+        backup = stream.index
         exception_store = []
         try:
             yield exception_store
         except Exception as err:
-            index = len(stream) + 1
-            while index <= len(backup):
-                stream.insert(0, backup[-index])
-                index += 1
+            if _PROFILE is not None:
+                _PROFILE.backtrack(self, stream.index - backup)
+            stream.index = backup
 
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            Token.exc_stack.insert(0, (exc_type, exc_obj, exc_tb))
+            if _TRACE is not None:
+                Token.exc_stack.insert(0, sys.exc_info())
+                _TRACE("error", err)
             exception_store.append(err)
 
     def _resolve_token(self, tokstream, token_value):
         results = []
         if token_value.greedy:
             while True:
+                start = tokstream.index
                 with self.rewindable(tokstream) as rewound:
-                    r = token_value.resolve(tokstream)
-                    if r:
-                        results.append(r)
-                    else:
-                        break
-                if rewound:  # An exception was thrown and we should stop.
+                    r = self._resolve_once(tokstream, token_value)
+                if rewound or not r:
+                    tokstream.index = start
                     break
+                results.append(r)
         else:
-            results = [token_value.resolve(tokstream)]
+            results = [self._resolve_once(tokstream, token_value)]
         if all(results) and any(results):
             return results
         return False
 
-    def _resolve_regex(self, tokstream, regex_value):
-        with self.rewindable(tokstream) as rewound:
-            tok_name, tok_text, tok_type, tok_pos = tokstream[0]
-            if re.match(regex_value, tok_text):
-                t = tokstream.pop(0)
-                global _PROCESSED
-                _PROCESSED += " "
-                _PROCESSED += t[1]
-                sys.stdout.write(" %s" % t.value)
-                return t
-        if rewound:
-            raise ParsingError("Parsing Error!\nExpected %s got %s" % (regex_value, tokstream[0][:-1]))
+    @staticmethod
+    def _resolve_once(tokstream, token_value):
+        memo = tokstream.memo
+        if memo is None or not token_value.is_rule:
+            return token_value.resolve(tokstream)
+
+        key = (token_value.name, tokstream.index)
+        entry = memo.get(key)
+        if entry is not None:
+            result, end = entry
+            if result is PackratMemo.FAILED:
+                return None
+            tokstream.index = end
+            return result
+        result = token_value.resolve(tokstream)
+        if result is None:
+            memo.put(key, PackratMemo.FAILED, None)
+        else:
+            memo.put(key, result, tokstream.index)
+        return result
+
+    def _matches(self, lex_token):
+        """
+        Terminal tokens match on the kind the lexer already assigned (see
+            lexer.accepted_kinds), the pattern in self.values is the regex from tokens.tok
+            and is informational only.
+        """
+        return lex_token.name in lexer.accepted_kinds(self.name)
+
+    def _expectation(self):
+        """
+        :returns: How this terminal is described when a syntax error is reported.
+        """
+        return self.name
+
+    def _resolve_terminal(self, tokstream, pattern):
+        index = tokstream.index
+        tokens = tokstream.tokens
+        if index < len(tokens):
+            token = tokens[index]
+            if self._matches(token):
+                tokstream.index = index + 1
+                if _TRACE is not None:
+                    _TRACE("consume", token)
+                return token
+        tokstream.expect(self._expectation())
+        return None
 
 
 class LiteralToken(Token):
     def __init__(self, value):
         super(LiteralToken, self).__init__(name="LiteralToken", values=[value])
+        # The grammar spells literals with their quotes, "curve" matches the text curve.
+        self.text = value[1:-1]
+
+    def _matches(self, lex_token):
+        return lex_token.value == self.text
+
+    def _expectation(self):
+        return repr(self.text)
 
 
 class OrToken(Token):
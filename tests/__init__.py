@@ -0,0 +1,11 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+from stunning import constants
+
+# Keep the test run out of the user's own cache directory.
+_CACHE_DIR = tempfile.mkdtemp(prefix="stunning-tests-")
+os.environ[constants.CACHE_DIR_ENV_KEY] = _CACHE_DIR
+atexit.register(shutil.rmtree, _CACHE_DIR, True)
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import stunning
+from stunning import parser
+from stunning.exceptions import UnexpectedTokenError
+from stunning.__main__ import main
+
+from tests.test_parser import t, t1
+
+
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for name, text in (("a.nk", t), ("b.nk", t1), ("broken.nk", "Blur {\n size }\n")):
+            path = os.path.join(self.directory, name)
+            with open(path, "w") as fh:
+                fh.write(text)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_many(self):
+        for workers in (1, 2):
+            results = sorted(stunning.parse_many(self.paths, workers=workers))
+            self.assertEqual([r.path for r in results], self.paths)
+            self.assertEqual([n.Class for n in results[0].nodes], ["ColorCorrect", "Blur", "Grade"])
+            self.assertEqual(results[1].nodes[0].tcl_node.varname, "N2f02ecd0")
+            self.assertIsNone(results[1].error)
+            self.assertIsNone(results[2].nodes)
+            self.assertTrue(results[2].error.startswith("UnexpectedTokenError: Unexpected CLOSE_BRACE"))
+
+    def test_lazy_package_exports(self):
+        # A fresh interpreter, this one has imported everything already.
+        code = "import sys, stunning.lexer; print('stunning.batch' in sys.modules, stunning.parse_many.__module__)"
+        output = subprocess.check_output([sys.executable, "-c", code], universal_newlines=True)
+        self.assertEqual(output.split(), ["False", "stunning.batch"])
+
+    def test_missing_file(self):
+        result, = stunning.parse_many([os.path.join(self.directory, "missing.nk")], workers=1)
+        self.assertTrue(result.error.startswith("FileNotFoundError"))
+
+    def test_parse_parallel(self):
+        text = t1 * 20
+        expected = parser.parse(text)
+        offsets = stunning.batch._split(text, 4)
+        self.assertEqual(len(offsets), 4)
+        self.assertTrue(all(text[offset:].startswith("ColorCorrect") for offset in offsets))
+        nodes = stunning.parse_parallel(text, workers=2, chunk_size=len(t1))
+        self.assertEqual([n.Class for n in nodes], [n.Class for n in expected])
+        self.assertEqual([n.to_dict() for n in nodes], [n.to_dict() for n in expected])
+
+    def test_parse_parallel_single_worker(self):
+        text = t1 * 20
+        with mock.patch("concurrent.futures.ProcessPoolExecutor", side_effect=AssertionError("pool started")):
+            nodes = stunning.parse_parallel(text, workers=1, chunk_size=len(t1))
+        self.assertEqual([n.to_dict() for n in nodes], [n.to_dict() for n in parser.parse(text)])
+
+    def test_parse_parallel_error(self):
+        text = t1 * 10 + "Blur {\n size }\n" + t1 * 10
+        with self.assertRaises(UnexpectedTokenError) as caught:
+            stunning.parse_parallel(text, workers=2, chunk_size=len(t1))
+        self.assertEqual(caught.exception.line, text[:text.index(" }")].count("\n") + 1)
+
+    def test_main(self):
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = main(["-j", "2", self.directory])
+        self.assertEqual(status, 1)
+        lines = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r["path"])
+        self.assertEqual([os.path.basename(line["path"]) for line in lines], ["a.nk", "b.nk", "broken.nk"])
+        grade = lines[1]["nodes"][2]
+        self.assertEqual(grade["Class"], "Grade")
+        self.assertEqual(grade["knobs"]["white"], [1, 0.808261, 0.460907, 1])
+        self.assertEqual(lines[1]["nodes"][0]["tcl_node"]["command"], "set")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+
+from stunning import parser
+from stunning.objects import AnimationCurve, MultiValueKnobObject
+
+from benchmarks import __main__ as runner
+from benchmarks.generate import generate_script
+
+
+class GenerateTestCase(unittest.TestCase):
+    def test_generated_script_parses(self):
+        text = generate_script(nodes=50, knobs=4, curves=0.5, stack=0.5)
+        nodes = parser.parse(text)
+        self.assertEqual(len(nodes), 50)
+        self.assertEqual(generate_script(nodes=50, knobs=4, curves=0.5, stack=0.5), text)
+        knobs = [node.knob(name) for node in nodes for name in node.knobs]
+        self.assertTrue(any(isinstance(knob.value, AnimationCurve) for knob in knobs))
+        self.assertTrue(any(isinstance(knob, MultiValueKnobObject) for knob in knobs))
+
+
+class CompareTestCase(unittest.TestCase):
+    def test_regressions(self):
+        baseline = {"runs": [{"nodes": 10, "lex_seconds": 1.0, "parse_seconds": 1.0, "peak_bytes": 100}]}
+        results = {"runs": [
+            {"nodes": 10, "lex_seconds": 1.05, "parse_seconds": 1.5, "peak_bytes": 100},
+            {"nodes": 20, "lex_seconds": 9.0, "parse_seconds": 9.0, "peak_bytes": 900},
+        ]}
+        regressions = runner.compare(results, baseline, 0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("parse_seconds", regressions[0])
+        self.assertEqual(runner._slope([(10, 1.0), (20, 2.0), (40, 4.0)]), 1.0)
+        self.assertIsNone(runner._slope([(10, 1.0), (10, 2.0)]))
+        self.assertIsNone(runner._slope([(10, 1.0)]))
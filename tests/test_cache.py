@@ -0,0 +1,78 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from stunning import cache, constants, parser
+
+from tests.test_parser import t, t1, t2
+
+
+class ParseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self._environ = dict(os.environ)
+        os.environ[constants.CACHE_DIR_ENV_KEY] = self.cache_dir
+        os.environ.pop(constants.PARSE_CACHE_SIZE_ENV_KEY, None)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._environ)
+        shutil.rmtree(self.cache_dir)
+
+    def entries(self):
+        return sorted(os.listdir(os.path.join(self.cache_dir, "parses")))
+
+    def test_hit_skips_lexing(self):
+        parsed = parser.parse(t1, cached=True)
+        self.assertEqual(len(self.entries()), 1)
+        with mock.patch.object(parser.lexer, "lex_buffer", side_effect=AssertionError("lexed")), \
+                mock.patch.object(parser, "compiled_parser", side_effect=AssertionError("parsed")), \
+                mock.patch.object(parser, "_interpret", side_effect=AssertionError("interpreted")):
+            loaded = parser.parse(t1, cached=True)
+            os.environ[constants.CACHE_DIR_ENV_KEY] = ""
+            self.assertRaises(AssertionError, parser.parse, t1, cached=True)
+        self.assertIsNot(loaded, parsed)
+        self.assertEqual([n.to_dict() for n in loaded], [n.to_dict() for n in parsed])
+        self.assertEqual(loaded[2].knob("white").values.g, 0.808261)
+
+    def test_key_follows_content(self):
+        parser.parse(t, cached=True)
+        parser.parse(t + "\n", cached=True)
+        parser.parse(t, cached=True)
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_lru_eviction(self):
+        for text in (t, t1):
+            parser.parse(text, cached=True)
+        first, second = [os.path.join(self.cache_dir, "parses", name) for name in self.entries()]
+        size = os.path.getsize(first) + os.path.getsize(second)
+        # Age both entries, then use t again so t1 is the least recently used.
+        for path in (first, second):
+            os.utime(path, (time.time() - 60, time.time() - 60))
+        parser.parse(t, cached=True)
+
+        os.environ[constants.PARSE_CACHE_SIZE_ENV_KEY] = str(size)
+        parser.parse(t2, cached=True)
+        self.assertEqual(len(self.entries()), 2)
+        self.assertEqual(parser.parse(t2, cached=True)[0].Class, "Grade")
+        self.assertTrue(os.path.exists(os.path.join(self.cache_dir, parser._parse_cache_name(t))))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, parser._parse_cache_name(t1))))
+
+    def test_misses_under_budget_do_not_rescan(self):
+        with mock.patch.object(cache, "_entries", wraps=cache._entries) as entries:
+            for index in range(5):
+                parser.parse(t + "\n" * index, cached=True)
+        self.assertEqual(len(self.entries()), 5)
+        self.assertEqual(entries.call_count, 1)
+
+    def test_disabled(self):
+        os.environ[constants.CACHE_DIR_ENV_KEY] = ""
+        self.assertEqual(len(parser.parse(t, cached=True)), 3)
+        self.assertIsNone(cache.load(parser._parse_cache_name(t)))
+
+
+if __name__ == "__main__":
+    unittest.main()
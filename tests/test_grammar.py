@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from stunning import constants, grammar
+# Registers the node and knob Token classes used by the grammar.
+from stunning import parser  # noqa: F401
+
+
+class GrammarTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self._environ = os.environ.get(constants.CACHE_DIR_ENV_KEY)
+        os.environ[constants.CACHE_DIR_ENV_KEY] = self.cache_dir
+        self._grammars = dict(grammar._GRAMMARS)
+        grammar._GRAMMARS.clear()
+
+    def tearDown(self):
+        grammar._GRAMMARS.clear()
+        grammar._GRAMMARS.update(self._grammars)
+        if self._environ is None:
+            os.environ.pop(constants.CACHE_DIR_ENV_KEY)
+        else:
+            os.environ[constants.CACHE_DIR_ENV_KEY] = self._environ
+        shutil.rmtree(self.cache_dir)
+
+    def test_built_once_per_process(self):
+        self.assertIs(grammar.build_grammar(), grammar.build_grammar())
+
+    def test_disk_cache(self):
+        built = grammar.build_grammar()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        grammar._GRAMMARS.clear()
+        loaded = grammar.build_grammar()
+        self.assertIsNot(loaded, built)
+        self.assertEqual(sorted(loaded), sorted(built))
+        self.assertEqual(loaded["node"][0][0].name, "WORD")
+
+    def test_stale_grammars_pruned(self):
+        for index in range(constants.GRAMMAR_CACHE_ENTRIES + 2):
+            path = os.path.join(self.cache_dir, "grammar-stale%d.pickle" % index)
+            with open(path, "wb"):
+                pass
+            os.utime(path, (time.time() - 60 + index, time.time() - 60 + index))
+        grammar.build_grammar()
+        names = sorted(os.listdir(self.cache_dir))
+        self.assertEqual(len(names), constants.GRAMMAR_CACHE_ENTRIES)
+        self.assertIn("grammar-%s.pickle" % grammar.build_grammar_key(), names)
+        self.assertNotIn("grammar-stale0.pickle", names)
+
+    def test_key_follows_grammar_content(self):
+        sources = grammar._read_sources(grammar._grammar_paths())
+        key = grammar.grammar_key(sources)
+        self.assertEqual(key, grammar.grammar_key(sources))
+        self.assertNotEqual(key, grammar.grammar_key(sources + ["extra::= WORD"]))
+
+    def test_first_sets(self):
+        firsts = grammar.first_sets(grammar.build_grammar())
+        self.assertEqual(firsts["tcl_expression"], {"TCL_SET", "TCL_PUSH"})
+        self.assertEqual(firsts["value"], {"OPEN_BRACE", "WORD", "TCL_SET", "TCL_PUSH", "FLOAT", "INT"})
+        self.assertEqual(firsts["single_value"], {"WORD", "TCL_SET", "TCL_PUSH", "FLOAT", "INT"})
+
+    def test_prediction_tables(self):
+        knob = grammar.build_grammar()["knoblist"][0][0]
+        value = knob.values[0][1]
+        # value::= animated_value|multi_value|single_value
+        self.assertEqual(
+            value.predict, dict.fromkeys(["OPEN_BRACE", "WORD", "TCL_SET", "TCL_PUSH", "FLOAT", "INT"], (0,))
+        )
+        either = value.values[0][0]
+        self.assertEqual(either.predict["OPEN_BRACE"], (0,))
+        self.assertEqual(either.predict["WORD"], (1,))
+        # Reserved words are still words.
+        self.assertEqual(either.predict["TCL_SET"], (1,))
+        self.assertNotIn("CLOSE_BRACE", either.predict)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+
+from stunning import parser
+from stunning.exceptions import StackError
+from stunning.graph import NodeGraph
+
+from tests.test_parser import t1
+
+
+merge = """Read {
+ inputs 0
+ name Read1
+}
+set Nplate [stack 0]
+Blur {
+ name Blur1
+}
+push $Nplate
+Grade {
+ name Grade1
+}
+Merge2 {
+ name Merge1
+}
+Constant {
+ name Constant1
+}
+Switch {
+ inputs 3
+ name Switch1
+}
+"""
+
+
+class GraphTestCase(unittest.TestCase):
+    def test_set_push(self):
+        graph = NodeGraph(parser.parse(t1))
+        self.assertEqual(len(graph), 3)
+        self.assertEqual(graph.inputs("Blur1"), [graph.node("ColorCorrect1")])
+        self.assertEqual(graph.inputs("Grade1"), [graph.node("ColorCorrect1")])
+        self.assertEqual(graph.inputs("ColorCorrect1"), [None])
+        self.assertEqual([n.knobs["name"] for n in graph.outputs("ColorCorrect1")], ["Blur1", "Grade1"])
+
+    def test_merge(self):
+        graph = NodeGraph(parser.parse(merge))
+        names = lambda nodes: [n.knobs["name"] if n is not None else None for n in nodes]
+        self.assertEqual(names(graph.inputs("Merge1")), ["Grade1", "Blur1"])
+        self.assertEqual(names(graph.inputs("Constant1")), [])
+        self.assertEqual(names(graph.inputs("Switch1")), ["Constant1", "Merge1", None])
+        self.assertEqual(names(graph.upstream("Switch1")), ["Constant1", "Merge1", "Grade1", "Blur1", "Read1"])
+        self.assertEqual(names(graph.downstream("Read1")), ["Blur1", "Grade1", "Merge1", "Switch1"])
+        self.assertEqual(names(graph.downstream(graph.node("Switch1"))), [])
+        self.assertEqual(names(graph), ["Read1", "Blur1", "Grade1", "Merge1", "Constant1", "Switch1"])
+        self.assertIn("Read1", graph)
+
+    def test_unset_push(self):
+        nodes = parser.parse("Blur {\n name Blur1\n}\npush $Nmissing\n")
+        self.assertRaises(StackError, NodeGraph, nodes)
+
+
+if __name__ == "__main__":
+    unittest.main()
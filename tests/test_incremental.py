@@ -0,0 +1,81 @@
+import unittest
+
+from stunning import incremental, parser
+from stunning.exceptions import UnexpectedTokenError
+
+from tests.test_parser import t1, t2
+
+
+class IncrementalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.state = incremental.parse(t1 + t2)
+
+    def assertMatchesParse(self, state):
+        self.assertEqual([n.to_dict() for n in state.nodes], [n.to_dict() for n in parser.parse(state.text)])
+        self.assertEqual(state.starts, incremental.parse(state.text).starts)
+
+    def edit(self, old, new, occurrence=0):
+        start = -1
+        for _ in range(occurrence + 1):
+            start = self.state.text.index(old, start + 1)
+        return start, start + len(old), new
+
+    def test_edit_reuses_other_nodes(self):
+        state = incremental.reparse(self.state, [self.edit("66.6", "12.5")])
+        self.assertMatchesParse(state)
+        self.assertEqual(state.nodes[1].knobs["size"], 12.5)
+        for index in (0, 2, 3):
+            self.assertIs(state.nodes[index], self.state.nodes[index])
+
+    def test_insert_and_delete_nodes(self):
+        blur = "\nBlur {\n name Blur2\n}"
+        state = incremental.reparse(self.state, [(len(t1), len(t1), blur)])
+        self.assertMatchesParse(state)
+        self.assertEqual([n.Class for n in state.nodes], ["ColorCorrect", "Blur", "Grade", "Blur", "Grade"])
+        self.assertIs(state.nodes[0], self.state.nodes[0])
+
+        start = state.text.index(blur)
+        state = incremental.reparse(state, [(start, start + len(blur), "")])
+        self.assertMatchesParse(state)
+        self.assertEqual(len(state.nodes), 4)
+
+    def test_sequential_edits(self):
+        first = self.edit("Blur1", "BlurNumberTwo")
+        # The second edit is in the offsets of the text after the first one.
+        second = self.edit("xpos 6102", "xpos 1")
+        second = (second[0] + 8, second[1] + 8, second[2])
+        state = incremental.reparse(self.state, [first, second, (0, 0, "\n\n")])
+        self.assertMatchesParse(state)
+        self.assertEqual(state.nodes[1].knobs["name"], "BlurNumberTwo")
+        self.assertEqual(state.nodes[3].knobs["xpos"], 1)
+        self.assertEqual(state.starts[0], 0)
+
+    def test_edit_moving_boundaries(self):
+        # Dropping a closing brace merges two nodes, which is a syntax error.
+        with self.assertRaises(UnexpectedTokenError):
+            incremental.reparse(self.state, [self.edit("}\nset", " \nset")])
+        # Turning a knob into a node moves boundaries inside the edited node.
+        state = incremental.reparse(self.state, [self.edit(" size 66.6\n", "}\nBlur {\n size 66.6\n")])
+        self.assertMatchesParse(state)
+        self.assertEqual(len(state.nodes), 5)
+
+
+    def test_edit_copies_only_touched_blocks(self):
+        state = incremental.parse(t1 * 120)
+        self.assertGreater(len(state._texts), 4)
+        start = state.span(150)[0] + 1
+        edited = incremental.reparse(state, [(start, start, "X")])
+        self.assertMatchesParse(edited)
+        self.assertEqual(edited.nodes[150].Class, "CXolorCorrect")
+        self.assertIs(edited._texts[0], state._texts[0])
+        self.assertIs(edited._nodes[-1], state._nodes[-1])
+
+        # Deleting whole nodes leaves whitespace behind, which joins a neighbour.
+        first, last = state.span(0)[0], state.span(3)[1]
+        edited = incremental.reparse(state, [(first, last, "\n"), (0, 0, " ")])
+        self.assertMatchesParse(edited)
+        self.assertEqual(len(edited.nodes), len(state.nodes) - 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
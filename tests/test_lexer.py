@@ -1,6 +1,9 @@
+import array
+import io
 import unittest
 
-from stunning import lexer
+from stunning import constants, lexer
+from stunning.exceptions import LexerError
 
 from tests.test_utils import BaseTimingTest
 
@@ -65,6 +68,40 @@ class LexerTestCase(BaseTimingTest):
         tokens = lexer.lex(test_simple_with_merge_text)
         self.assertEqual(len(tokens), 263)
 
+    @BaseTimingTest.timing
+    def test_skip_ignored(self):
+        tokens = lexer.lex(test_simple_with_merge_text)
+        skipped = lexer.lex(test_simple_with_merge_text, skip_ignored=True)
+        self.assertEqual(skipped, [t for t in tokens if t.tag != constants.IGNORE])
+
+    @BaseTimingTest.timing
+    def test_iter_lex_chunked(self):
+        tokens = lexer.lex(test_simple_with_merge_text)
+        for chunk_size in (1, 7, 64, 4096):
+            fh = io.StringIO(test_simple_with_merge_text)
+            self.assertEqual(list(lexer.iter_lex(fh, chunk_size=chunk_size)), tokens)
+
+        skipped = lexer.lex(test_simple_with_merge_text, skip_ignored=True)
+        fh = io.StringIO(test_simple_with_merge_text)
+        self.assertEqual(list(lexer.iter_lex(fh, skip_ignored=True, chunk_size=5)), skipped)
+
+    @BaseTimingTest.timing
+    def test_token_buffer(self):
+        tokens = lexer.lex(test_simple_with_merge_text, skip_ignored=True)
+        for source in (test_simple_with_merge_text, test_simple_with_merge_text.encode("ascii")):
+            buffer = lexer.lex_buffer(source, skip_ignored=True)
+            self.assertEqual(len(buffer), len(tokens))
+            self.assertEqual(list(buffer), tokens)
+            self.assertEqual(buffer[3:5], tokens[3:5])
+            self.assertEqual(buffer.name(0), "TCL_SET")
+            self.assertEqual(buffer.text(1), "cut_paste_input")
+            self.assertIsInstance(buffer.kinds, array.array)
+        self.assertEqual(list(lexer.lex_buffer(test_simple_with_merge_text)), lexer.lex(test_simple_with_merge_text))
+        self.assertRaises(LexerError, lexer.lex_buffer, b"Blur {\n size 1 ;\n}", True)
+
+    def test_illegal_character(self):
+        self.assertRaises(LexerError, lexer.lex, "Blur {\n size 1 ;\n}", True)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,81 @@
+import array
+import pickle
+import unittest
+
+from stunning import objects
+from stunning.exceptions import KeyFrameError
+from stunning.objects import NodeObject, KnobObject, SetTCLObject, MultiValue, MultiValueKnobObject, AnimationCurve
+
+
+class ObjectsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.node = NodeObject(
+            "Blur",
+            SetTCLObject("set", "N1", "[", "stack", "0", "]"),
+            KnobObject("name", "Blur1"),
+            KnobObject("size", 66.6),
+        )
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.node, "__dict__"))
+        self.assertFalse(hasattr(self.node.knob("size"), "__dict__"))
+        self.assertFalse(hasattr(self.node.tcl_node, "__dict__"))
+
+    def test_knob_lookup(self):
+        knobs = self.node.knobs
+        self.assertEqual(knobs["size"], 66.6)
+        self.assertIn("name", knobs)
+        self.assertEqual(list(knobs), ["name", "size"])
+        self.assertEqual(knobs, {"name": "Blur1", "size": 66.6})
+        self.assertIs(self.node.knob("name"), self.node.knob("name"))
+        self.assertRaises(KeyError, self.node.knob, "missing")
+        with self.assertRaises(TypeError):
+            knobs["size"] = 1
+
+    def test_pickle(self):
+        node = pickle.loads(pickle.dumps(self.node, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual(node.Class, "Blur")
+        self.assertEqual(node.knobs, self.node.knobs)
+        self.assertEqual(node.tcl_node.varname, "N1")
+
+    def test_multi_value(self):
+        knob = MultiValueKnobObject("white", [1, 0.808261, 0.460907, 1, 0.5])
+        value = knob.value
+        self.assertIsInstance(value.data, array.array)
+        self.assertEqual(value, (1, 0.808261, 0.460907, 1, 0.5))
+        self.assertEqual(len(value), 5)
+        self.assertEqual((value.r, value.g, value.a, value.r1), (1, 0.808261, 1, 0.5))
+        self.assertRaises(AttributeError, getattr, value, "g1")
+        self.assertIs(type(value), type(MultiValueKnobObject("center", [1, 2]).value))
+        self.assertEqual(pickle.loads(pickle.dumps(value)), value)
+
+    def test_multi_value_words(self):
+        value = MultiValue(["rgba", True])
+        self.assertEqual(value.data, ("rgba", True))
+        self.assertEqual(value, ["rgba", True])
+        self.assertIs(value.g, True)
+
+    def test_animation_curve(self):
+        curve = AnimationCurve([1003, 1001, 1002], [3, 1, 2])
+        self.assertTrue(curve)
+        self.assertIsInstance(curve.frames, array.array)
+        self.assertEqual(curve.keyframes, [(1001, 1), (1002, 2), (1003, 3)])
+        self.assertEqual(curve.valueAt(1002), 2)
+        self.assertRaises(KeyFrameError, curve.valueAt, 1004)
+        self.assertEqual(list(curve.valuesAt(range(1001, 1004))), [1, 2, 3])
+        self.assertRaises(KeyFrameError, curve.valuesAt, [1001, 1000])
+        self.assertRaises(KeyFrameError, AnimationCurve([], []).valuesAt, [1])
+        self.assertEqual(list(curve.valuesAt(frame for frame in range(1001, 1004))), [1, 2, 3])
+
+    @unittest.skipUnless(objects.numpy, "NumPy is not installed")
+    def test_animation_curve_numpy(self):
+        curve = AnimationCurve([1001, 1002, 1003], [1, 2, 3])
+        for frames in ([1001, 1003], range(1001, 1004, 2), objects.numpy.array([1001, 1003]), iter([1001, 1003])):
+            values = curve.valuesAt(frames)
+            self.assertIsInstance(values, objects.numpy.ndarray)
+            self.assertEqual(values.tolist(), [1, 3])
+        self.assertRaises(KeyFrameError, curve.valuesAt, (frame for frame in [1001, 1000]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,16 @@
+import io
+import mmap
+import os
+import sys
+import tempfile
+import types
 import unittest
+from unittest import mock
 
 from stunning import parser
-from stunning.exceptions import KeyFrameError
+from stunning.exceptions import KeyFrameError, UnexpectedTokenError
+from stunning.objects import LazyKnobObject
+from stunning.token import PackratMemo, Token, set_trace
 
 from tests.test_utils import BaseTimingTest
 
@@ -86,6 +95,77 @@ class ParserTestCase(BaseTimingTest):
         self.assertEqual(nodes[2].knobs["white"].r, 1)
         self.assertEqual(nodes[2].knobs["white"], (1, 0.808261, 0.460907, 1))
 
+    @BaseTimingTest.timing
+    def test_compiled_matches_interpreter(self):
+        for text in (t, t1):
+            compiled = parser.parse(text)
+            interpreted = parser.parse(text, compiled=False)
+            self.assertEqual([n.Class for n in compiled], [n.Class for n in interpreted])
+            self.assertEqual([n.knobs for n in compiled], [n.knobs for n in interpreted])
+            self.assertEqual(
+                [n.tcl_node and n.tcl_node.args for n in compiled],
+                [n.tcl_node and n.tcl_node.args for n in interpreted],
+            )
+
+    def test_reserved_words_as_values(self):
+        text = "Blur {\n label set\n push push\n size 1\n}\nset N1 [stack 0]\nGrade {\n name Grade1\n}\npush $N1\n"
+        for compiled in (True, False):
+            nodes = parser.parse(text, compiled=compiled)
+            self.assertEqual(nodes[0].knobs, {"label": "set", "push": "push", "size": 1})
+            self.assertEqual(nodes[0].tcl_node.varname, "N1")
+            self.assertEqual(nodes[1].tcl_node.command, "push")
+        self.assertEqual(parser.parse(text, knobs={"label"})[0].knobs, {"label": "set"})
+
+    def test_quiet_by_default(self):
+        parser.parse(t)
+        parser.parse(t, compiled=False)
+        self.assertEqual(sys.stdout.getvalue(), "")
+
+    def test_trace_hook(self):
+        events = []
+        previous = set_trace(lambda event, payload: events.append((event, payload)))
+        try:
+            nodes = parser.parse(t)
+        finally:
+            set_trace(previous)
+        self.assertEqual(len(nodes), 3)
+        consumed = [payload.value for event, payload in events if event == "consume"]
+        self.assertEqual(consumed[:3], ["ColorCorrect", "{", "name"])
+        self.assertIn("backtrack", [event for event, _ in events])
+
+    def test_syntax_error(self):
+        text = "Blur {\n name Blur1\n size\n}\n"
+        for compiled in (True, False):
+            with self.assertRaises(UnexpectedTokenError) as context:
+                parser.parse(text, compiled=compiled)
+            error = context.exception
+            self.assertEqual((error.line, error.column), (4, 1))
+            self.assertEqual(error.token.name, "CLOSE_BRACE")
+            self.assertEqual(error.expected, {"OPEN_BRACE", "WORD", "FLOAT", "INT"})
+            self.assertIn("line 4, column 1", str(error))
+
+    def test_syntax_error_at_end_of_text(self):
+        with self.assertRaises(UnexpectedTokenError) as context:
+            parser.parse("Blur {\n size 1\n")
+        self.assertIsNone(context.exception.token)
+        self.assertIn("CLOSE_BRACE", context.exception.expected)
+        self.assertIn("end of text", str(context.exception))
+
+    @BaseTimingTest.timing
+    def test_packrat(self):
+        nodes = parser.parse(t1, packrat=True)
+        self.assertEqual([n.Class for n in nodes], ["ColorCorrect", "Blur", "Grade"])
+        self.assertEqual(nodes[2].knobs, parser.parse(t1)[2].knobs)
+        self.assertEqual(nodes[0].tcl_node.varname, "N2f02ecd0")
+
+    def test_packrat_memo_is_bounded(self):
+        memo = PackratMemo(2)
+        for index in range(3):
+            memo.put(("knob", index), index, index + 1)
+        self.assertEqual(len(memo), 2)
+        self.assertIsNone(memo.get(("knob", 0)))
+        self.assertEqual(memo.get(("knob", 2)), (2, 3))
+
     @BaseTimingTest.timing
     def test_animated_value(self):
         nodes = parser.parse(t2)
@@ -93,7 +173,137 @@ class ParserTestCase(BaseTimingTest):
         self.assertEqual(nodes[0].Class, "Grade")
         self.assertEqual(nodes[0].knobs["white"].valueAt(1001), 1)
         self.assertEqual(nodes[0].knobs["white"].valueAt(1006), 2)
-        self.assertRaises(nodes[0].knobs["white"].valueAt(1003), KeyFrameError)
+        self.assertRaises(KeyFrameError, nodes[0].knobs["white"].valueAt, 1003)
+
+    @BaseTimingTest.timing
+    def test_animated_value_implicit_frames(self):
+        nodes = parser.parse("Blur {\n size {{curve K x1 0 2 s0 x10 5 x 20 6}}\n}\n")
+        self.assertEqual(nodes[0].knobs["size"].keyframes, [(1, 0), (2, 2), (10, 5), (20, 6)])
+        nodes = parser.parse("Blur {\n size {{curve x1 0 s-0.5 x10 5 t 2 6 L 7}}\n}\n")
+        self.assertEqual(nodes[0].knobs["size"].keyframes, [(1, 0), (10, 5), (11, 6), (12, 7)])
+        interpreted = parser.parse(t2, compiled=False)[0].knobs["white"]
+        self.assertEqual(interpreted.keyframes, parser.parse(t2)[0].knobs["white"].keyframes)
+
+    @BaseTimingTest.timing
+    def test_lazy(self):
+        for text in (t, t1, t2):
+            eager = parser.parse(text)
+            lazy = parser.parse(text, lazy=True)
+            self.assertEqual([n.Class for n in lazy], [n.Class for n in eager])
+            for eager_node, lazy_node in zip(eager, lazy):
+                self.assertEqual(dict(lazy_node.knobs), dict(eager_node.knobs))
+
+    @BaseTimingTest.timing
+    def test_lazy_decodes_on_read(self):
+        node = parser.parse(t2, lazy=True)[0]
+        white = node.knob("white")
+        self.assertIsInstance(white, LazyKnobObject)
+        self.assertEqual(t2[slice(*white.span)], "{{curve x1001 1 x1006 2}}")
+        self.assertIsNotNone(white._source)
+        self.assertEqual(white.value.valueAt(1006), 2)
+        self.assertIsNone(white._source)
+        self.assertIs(node.knobs["black_clamp"], False)
+        self.assertEqual(parser.decode_value("{1 0.5 a}"), [1, 0.5, "a"])
+
+    def test_lazy_decode_skips_interpreter(self):
+        eager = parser.parse(t1 + t2)
+        lazy = parser.parse(t1 + t2, lazy=True)
+        # Multi-values are cast straight from their tokens and curves use the compiled rule.
+        with mock.patch.object(Token, "resolve", side_effect=AssertionError("interpreted")):
+            for eager_node, lazy_node in zip(eager, lazy):
+                self.assertEqual(dict(lazy_node.knobs), dict(eager_node.knobs))
+        self.assertEqual(parser.decode_value("{{curve x1 0 x5 2}}", compiled=False).keyframes, [(1, 0), (5, 2)])
+
+    @BaseTimingTest.timing
+    def test_iter_nodes(self):
+        for compiled in (True, False):
+            nodes = parser.iter_nodes(io.StringIO(t1 + t2), compiled=compiled)
+            self.assertIsInstance(nodes, types.GeneratorType)
+            nodes = list(nodes)
+            self.assertEqual([n.Class for n in nodes], ["ColorCorrect", "Blur", "Grade", "Grade"])
+            self.assertEqual(nodes[0].tcl_node.varname, "N2f02ecd0")
+            self.assertEqual(nodes[1].tcl_node.varname, "N2f02ecd0")
+            self.assertIsNone(nodes[2].tcl_node)
+            self.assertEqual(dict(nodes[2].knobs), dict(parser.parse(t1)[2].knobs))
+
+    @BaseTimingTest.timing
+    def test_iter_nodes_error(self):
+        nodes = parser.iter_nodes(io.StringIO(t + "Blur {\n size }\n"))
+        self.assertEqual(next(nodes).Class, "ColorCorrect")
+        with self.assertRaises(UnexpectedTokenError) as caught:
+            list(nodes)
+        self.assertEqual(caught.exception.offset, len(t) + 13)
+        self.assertIsNone(caught.exception.line)
+        self.assertIn("at offset", str(caught.exception))
+
+    @BaseTimingTest.timing
+    def test_projection(self):
+        nodes = parser.parse(t1 + t2, classes={"Grade"}, knobs={"name", "white"})
+        self.assertEqual([n.Class for n in nodes], ["Grade", "Grade"])
+        self.assertEqual(list(nodes[0].knobs), ["white", "name"])
+        self.assertEqual(nodes[1].knobs["name"], "Grade4")
+        self.assertEqual(nodes[1].knobs["white"].valueAt(1006), 2)
+
+        nodes = parser.parse(t1, knobs={"xpos"})
+        self.assertEqual([dict(n.knobs) for n in nodes], [{"xpos": -150}, {"xpos": -40}, {"xpos": -150}])
+        self.assertEqual([n.tcl_node.varname for n in nodes[:2]], ["N2f02ecd0", "N2f02ecd0"])
+        self.assertIsNone(nodes[2].tcl_node)
+
+        every_class = {"ColorCorrect", "Blur", "Grade"}
+        self.assertEqual(
+            [n.to_dict() for n in parser.parse(t1 + t2, classes=every_class)],
+            [n.to_dict() for n in parser.parse(t1 + t2)],
+        )
+
+    @BaseTimingTest.timing
+    def test_projection_errors(self):
+        text = t + "Blur {\n size }\n"
+        self.assertEqual(parser.parse(text, classes={"Grade"})[0].Class, "Grade")
+        with self.assertRaises(UnexpectedTokenError) as caught:
+            parser.parse(text, classes={"Blur"})
+        self.assertEqual((caught.exception.line, caught.exception.column), (text.count("\n"), 7))
+        # A single token value is still checked against single_value.
+        for compiled in (True, False):
+            with self.assertRaises(UnexpectedTokenError) as caught:
+                parser.parse("Blur {\n size [\n}\n", knobs={"size"}, compiled=compiled)
+            self.assertEqual(caught.exception.token.name, "OPEN_BRACKET")
+
+    @BaseTimingTest.timing
+    def test_parse_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "script.nk")
+            with open(path, "w") as fh:
+                fh.write(t1 + t2)
+            nodes = parser.parse_file(path)
+            self.assertEqual([n.to_dict() for n in nodes], [n.to_dict() for n in parser.parse(t1 + t2)])
+            self.assertIsInstance(nodes[0].knobs["name"], str)
+
+            lazy = parser.parse_file(path, lazy=True)
+            self.assertEqual(lazy[3].knobs["white"].valueAt(1006), 2)
+            self.assertEqual(lazy[2].knobs["white"], nodes[2].knobs["white"])
+
+            # Cached results are eager, so the map is closed even when lazy is asked for.
+            maps = []
+            real_mmap = mmap.mmap
+
+            def mapped(*args, **kwargs):
+                maps.append(real_mmap(*args, **kwargs))
+                return maps[-1]
+
+            with mock.patch.object(parser.mmap, "mmap", side_effect=mapped):
+                for _ in range(2):
+                    cached = parser.parse_file(path, lazy=True, cached=True)
+            self.assertEqual([n.to_dict() for n in cached], [n.to_dict() for n in nodes])
+            self.assertTrue(all(source.closed for source in maps))
+            with open(path, "rb") as fh:
+                self.assertRaises(TypeError, parser.parse, fh.read(), classes={"Grade"})
+
+            with open(path, "a") as fh:
+                fh.write("\nBlur {\n size }\n")
+            with self.assertRaises(UnexpectedTokenError) as caught:
+                parser.parse_file(path)
+            self.assertEqual(caught.exception.line, (t1 + t2).count("\n") + 3)
+            self.assertIsInstance(caught.exception.text, str)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from stunning import parser
+from stunning.profiling import Profile
+from stunning.token import profiling
+
+from tests.test_parser import t
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def test_rule_counters(self):
+        with Profile() as profile:
+            self.assertTrue(profiling())
+            nodes = parser.parse(t)
+        self.assertFalse(profiling())
+        self.assertEqual([n.to_dict() for n in nodes], [n.to_dict() for n in parser.parse(t)])
+
+        node = profile.rules["node"]
+        self.assertEqual(node.successes, 3)
+        self.assertGreaterEqual(node.attempts, node.successes)
+        self.assertGreater(node.backtracks, 0)
+        self.assertGreater(node.rewound, 0)
+        nodelist = profile.rules["nodelist"]
+        self.assertEqual(nodelist.attempts, 1)
+        self.assertGreaterEqual(nodelist.seconds, node.seconds)
+        for stats in profile.rules.values():
+            self.assertLessEqual(stats.own_seconds, stats.seconds + 1e-9)
+
+        report = profile.report(sort="backtracks", limit=2).splitlines()
+        self.assertEqual(len(report), 3)
+        self.assertTrue(report[0].startswith("rule"))
+        self.assertRaises(ValueError, profile.report, sort="name")
+
+    def test_folded(self):
+        with Profile() as profile:
+            parser.parse(t)
+        stacks = [line.rsplit(" ", 1)[0] for line in profile.folded()]
+        self.assertIn("nodelist;node", stacks)
+        for stack in stacks:
+            self.assertTrue(stack.startswith("nodelist"))
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "parse.folded")
+            profile.write_folded(path)
+            with open(path) as fh:
+                self.assertEqual(fh.read().splitlines(), profile.folded())
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,61 @@
+import re
+import unittest
+
+from stunning import parser
+from stunning.script import Script
+
+reads = """Read {
+ inputs 0
+ colorspace linear
+ name Read1
+}
+Read {
+ inputs 0
+ colorspace sRGB
+ name Read2
+}
+Grade {
+ white {1 0.5 0.5 1}
+ name Grade1
+}
+Write {
+ colorspace linear_ACES
+ name Write1
+}
+"""
+
+
+class ScriptTestCase(unittest.TestCase):
+    def setUp(self):
+        self.script = Script(parser.parse(reads))
+
+    def names(self, nodes):
+        return [node.knobs["name"] for node in nodes]
+
+    def test_sequence(self):
+        self.assertEqual(len(self.script), 4)
+        self.assertEqual(self.script[2].Class, "Grade")
+        self.assertEqual(sorted(self.script.classes), ["Grade", "Read", "Write"])
+
+    def test_lookups(self):
+        self.assertEqual(self.script.node("Grade1").Class, "Grade")
+        self.assertRaises(KeyError, self.script.node, "Missing1")
+        self.assertEqual(self.names(self.script.of_class("Read")), ["Read1", "Read2"])
+        self.assertEqual(self.names(self.script.with_knob("colorspace")), ["Read1", "Read2", "Write1"])
+
+    def test_find(self):
+        find = self.script.find
+        self.assertEqual(self.names(find(Class="Read", knobs={"colorspace": "lin*"})), ["Read1"])
+        self.assertEqual(self.names(find(knobs={"colorspace": "lin*"})), ["Read1", "Write1"])
+        self.assertEqual(self.names(find(Class=("Read", "Write"), knobs={"colorspace": re.compile(r"RGB")})), ["Read2"])
+        self.assertEqual(self.names(find(knobs={"white": lambda value: value.g == 0.5})), ["Grade1"])
+        self.assertEqual(self.names(find(knobs={"name": "Write1", "colorspace": None})), ["Write1"])
+        self.assertEqual(self.names(find(name="Read2", Class="Read")), ["Read2"])
+        self.assertEqual(find(Class="Blur"), [])
+        self.assertEqual(self.names(find(knobs={"colorspace": "linear"})), ["Read1"])
+        self.assertEqual(self.names(find(knobs={"inputs": 0})), ["Read1", "Read2"])
+        self.assertEqual(len(find()), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()